@@ -0,0 +1,445 @@
+"""
+Benchmark suite with one scenario for every example in the examples directory.
+
+Every scenario handles a payload of a configurable size, like the number of records, the
+number of items in the suitcase or the number of interfaces on a device. For every scenario
+we report:
+- ops/sec: the number of payloads handled per second
+- p50 and p99: the latency of handling a single payload
+- allocated bytes: the memory allocated while handling a single payload (using tracemalloc)
+
+The results can be stored as a JSON baseline and later runs can be compared against that
+baseline to flag regressions:
+
+python benchmarks/benchmark_examples.py --size 100 --save baseline.json
+python benchmarks/benchmark_examples.py --size 100 --compare baseline.json
+
+Comparing exits with 1 when a scenario got slower, or allocates more, than the threshold allows.
+"""
+import argparse
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from enum import Enum
+import ipaddress
+import itertools
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Annotated, Any, Callable, Dict, List, Literal, Optional, Union
+from uuid import UUID
+
+import pydantic
+from pydantic import (
+    BaseModel,
+    BeforeValidator,
+    ConfigDict,
+    Field,
+    computed_field,
+    create_model,
+    field_validator,
+    model_validator,
+    validate_call,
+)
+
+
+Scenario = Callable[[int], Callable[[], Any]]
+
+SCENARIOS: Dict[str, Scenario] = {}
+
+
+def scenario(name: str) -> Callable[[Scenario], Scenario]:
+    """
+    Register a scenario.
+
+    A scenario takes the payload size and returns the function that is benchmarked.
+    """
+
+    def register(function: Scenario) -> Scenario:
+        SCENARIOS[name] = function
+        return function
+
+    return register
+
+
+# 00 and 01: BaseModel and dataclass
+@dataclass
+class HumanDataClass:
+    name: str
+    age: int
+
+
+class HumanBaseModel(BaseModel):
+    name: str
+    age: int
+
+
+@scenario("00_model_dump_json")
+def dump_json(size: int) -> Callable[[], Any]:
+    humans = [HumanBaseModel(name=f"human-{i}", age=i) for i in range(size)]
+    return lambda: [human.model_dump_json() for human in humans]
+
+
+@scenario("01_dataclass")
+def dataclass_records(size: int) -> Callable[[], Any]:
+    records = [{"name": f"human-{i}", "age": i} for i in range(size)]
+    return lambda: [HumanDataClass(**record) for record in records]
+
+
+@scenario("01_basemodel")
+def basemodel_records(size: int) -> Callable[[], Any]:
+    records = [{"name": f"human-{i}", "age": i} for i in range(size)]
+    return lambda: [HumanBaseModel(**record) for record in records]
+
+
+# 02: nested models
+class Suitcase(BaseModel):
+    items: list
+
+
+class Human(BaseModel):
+    name: str
+    age: int
+    suitcase: Optional[Suitcase]
+
+
+@scenario("02_nested_models")
+def nested_models(size: int) -> Callable[[], Any]:
+    data = {"name": "jan", "age": 6, "suitcase": {"items": [f"item-{i}" for i in range(size)]}}
+    return lambda: Human(**data)
+
+
+# 03 and 04: enums
+class Vendor(str, Enum):
+    CISCO = "cisco"
+    ARISTA = "arista"
+    JUNIPER = "juniper"
+
+
+class Router(BaseModel):
+    model: Vendor = Vendor.CISCO
+
+
+class RouterEnumValues(BaseModel):
+    model_config = ConfigDict(use_enum_values=True, validate_default=True)
+
+    model: Vendor = Vendor.CISCO
+
+
+@scenario("03_enum_choices")
+def enum_choices(size: int) -> Callable[[], Any]:
+    vendors = [vendor.value for vendor, _ in zip(itertools.cycle(Vendor), range(size))]
+    return lambda: [Router(model=vendor) for vendor in vendors]
+
+
+@scenario("04_enum_values")
+def enum_values(size: int) -> Callable[[], Any]:
+    routers = [RouterEnumValues(model=vendor) for vendor, _ in zip(itertools.cycle(Vendor), range(size))]
+    return lambda: [router.model_dump_json() for router in routers]
+
+
+# 05: field validators
+class InputValues(BaseModel):
+    vlan: int
+
+    @field_validator("vlan")
+    @classmethod
+    def vlan_validator(cls, v):
+        assert v >= 1, "invalid vlan number, number too low"
+        assert v <= 4094, "invalid vlan number, number too high"
+        return v
+
+
+@scenario("05_field_validator")
+def field_validators(size: int) -> Callable[[], Any]:
+    vlans = [i % 4094 + 1 for i in range(size)]
+    return lambda: [InputValues(vlan=vlan) for vlan in vlans]
+
+
+# 06: before validators
+class SanitizedDevice(BaseModel):
+    hostname: str
+
+    @model_validator(mode="before")
+    @classmethod
+    def sanitize_hostname(cls, data: Any) -> Any:
+        data["hostname"] = data["hostname"].strip().lower()
+        return data
+
+
+@scenario("06_before_validator")
+def before_validators(size: int) -> Callable[[], Any]:
+    hostnames = [f" RouteR-{i} " for i in range(size)]
+    return lambda: [SanitizedDevice(hostname=hostname) for hostname in hostnames]
+
+
+# 07: model validators
+class Interface(BaseModel):
+    interface_name: str
+    ipv4: Union[ipaddress.IPv4Interface, None] = None
+
+
+class NetworkDevice(BaseModel):
+    fqdn_name: str
+    hostname: str
+    mgmt_ip: ipaddress.IPv4Interface
+    interfaces: List[Interface] = []
+
+    @model_validator(mode="after")
+    def check_fqdn_name(self):
+        if self.hostname not in self.fqdn_name:
+            raise ValueError(f"hostname {self.hostname} must be included in fqdn_name {self.fqdn_name}.")
+        return self
+
+    @model_validator(mode="after")
+    def check_ipv4_overlap(self):
+        all_ip_addresses = [self.mgmt_ip] + [i.ipv4 for i in self.interfaces if i.ipv4]
+        for ip1, ip2 in itertools.combinations(all_ip_addresses, 2):
+            if ip1.network.overlaps(ip2.network):
+                raise ValueError(f"Overlapping IPs detected:{ip1.network} and {ip2.network}")
+        return self
+
+
+@scenario("07_model_validator")
+def model_validators(size: int) -> Callable[[], Any]:
+    data = {
+        "hostname": "router-1",
+        "fqdn_name": "router-1.example.com",
+        "mgmt_ip": "1.1.1.1/32",
+        "interfaces": [
+            {"interface_name": f"et-0/0/{i}", "ipv4": f"10.{i // 256 % 256}.{i % 256}.0/31"} for i in range(size)
+        ],
+    }
+    return lambda: NetworkDevice(**data)
+
+
+# 08: dynamic model creation
+@scenario("08_create_model")
+def dynamic_models(size: int) -> Callable[[], Any]:
+    fields = {f"field_{i}": (int, ...) for i in range(size)}
+    data = {f"field_{i}": i for i in range(size)}
+    return lambda: create_model("DynamicModel", **fields)(**data)
+
+
+# 09: coercion and strict mode
+class Brand(Enum):
+    BMW = "bmw"
+    VOLKSWAGEN = "volkswagen"
+
+
+class Car(BaseModel):
+    uuid: UUID
+    address: ipaddress.IPv4Interface
+    brand: Brand
+
+
+@scenario("09_lax")
+def lax_mode(size: int) -> Callable[[], Any]:
+    records = [
+        {"uuid": "177ef0d8-6630-11ea-b69a-0242ac130003", "address": f"10.0.{i % 256}.1/32", "brand": "volkswagen"}
+        for i in range(size)
+    ]
+    return lambda: [Car.model_validate(record) for record in records]
+
+
+@scenario("09_strict")
+def strict_mode(size: int) -> Callable[[], Any]:
+    records = [
+        {
+            "uuid": UUID("177ef0d8-6630-11ea-b69a-0242ac130003"),
+            "address": ipaddress.IPv4Interface(f"10.0.{i % 256}.1/32"),
+            "brand": Brand.VOLKSWAGEN,
+        }
+        for i in range(size)
+    ]
+    return lambda: [Car.model_validate(record, strict=True) for record in records]
+
+
+# 10: aliasing
+class AliasedModel(BaseModel):
+    field_name: str = Field(..., alias="FieldName")
+
+
+@scenario("10_aliasing")
+def aliasing(size: int) -> Callable[[], Any]:
+    records = [{"FieldName": f"johndoe-{i}"} for i in range(size)]
+    return lambda: [AliasedModel(**record).model_dump_json(by_alias=True) for record in records]
+
+
+# 11: computed fields
+class Os(Enum):
+    EOS = "eos"
+    JUNOS = "junos"
+    IOSXE = "iosxe"
+
+
+class ComputedDevice(ABC, BaseModel):
+    hostname: str
+    os: Os
+
+    @computed_field
+    @property
+    def fqdn_name(self) -> str:
+        return f"{self.hostname}.example.come"
+
+    @abstractmethod
+    def register_with_monitoring_system(self):
+        pass
+
+
+class ComputedRouter(ComputedDevice):
+    loopback: ipaddress.IPv4Interface
+
+    def register_with_monitoring_system(self):
+        return self.model_dump_json()
+
+
+@scenario("11_computed_field")
+def computed_fields(size: int) -> Callable[[], Any]:
+    routers = [ComputedRouter(hostname=f"router-{i}", os=Os.JUNOS, loopback="1.1.1.1/32") for i in range(size)]
+    return lambda: [router.register_with_monitoring_system() for router in routers]
+
+
+# 12: validate_call
+def validate_no_q(v: str) -> str:
+    if "q" in v.lower():
+        raise ValueError("The string must not contain the letter 'q'")
+    return v
+
+
+def validate_no_z(v: str) -> str:
+    if "z" in v.lower():
+        raise ValueError("The string must not contain the letter 'z'")
+    return v
+
+
+NonEmptyStringExtended = Annotated[
+    str,
+    Field(min_length=1),
+    BeforeValidator(validate_no_q),
+    BeforeValidator(validate_no_z),
+]
+
+
+@validate_call
+def extract_a_char(s: NonEmptyStringExtended) -> str:
+    return s[0]
+
+
+@validate_call
+def do_something(action: Literal["START", "STOP"]) -> str:
+    return f"Performing action: {action}"
+
+
+@scenario("12_validate_call")
+def validated_calls(size: int) -> Callable[[], Any]:
+    strings = [f"string-{i}" for i in range(size)]
+    return lambda: [(extract_a_char(s), do_something("START")) for s in strings]
+
+
+def measure(function: Callable[[], Any], duration: float, min_rounds: int) -> Dict[str, float]:
+    """
+    Time single runs of the function until both the duration and the minimum number of rounds
+    are reached, then measure the allocations of one more run.
+    """
+    function()  # warm up
+    timings = []
+    started = time.perf_counter()
+    while len(timings) < min_rounds or time.perf_counter() - started < duration:
+        start = time.perf_counter_ns()
+        function()
+        timings.append(time.perf_counter_ns() - start)
+    timings.sort()
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "rounds": len(timings),
+        "ops_per_sec": 1e9 * len(timings) / sum(timings),
+        "p50_us": timings[len(timings) // 2] / 1e3,
+        "p99_us": timings[min(len(timings) - 1, int(len(timings) * 0.99))] / 1e3,
+        "allocated_bytes": peak,
+    }
+
+
+def run(size: int, duration: float, min_rounds: int, selected: Optional[List[str]] = None) -> Dict[str, Any]:
+    results = {}
+    for name, setup in SCENARIOS.items():
+        if selected and name not in selected:
+            continue
+        results[name] = measure(setup(size), duration, min_rounds)
+        print(
+            f"{name:<22} {results[name]['ops_per_sec']:>12.1f} ops/sec"
+            f" p50 {results[name]['p50_us']:>10.1f}us p99 {results[name]['p99_us']:>10.1f}us"
+            f" {results[name]['allocated_bytes']:>10} bytes"
+        )
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "pydantic": pydantic.VERSION,
+            "size": size,
+        },
+        "results": results,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """
+    Return a description of every scenario that regressed by more than threshold (0.1 = 10%).
+    """
+    if current["meta"]["size"] != baseline["meta"]["size"]:
+        raise ValueError(
+            f"cannot compare a run with size {current['meta']['size']} "
+            f"to a baseline with size {baseline['meta']['size']}"
+        )
+    regressions = []
+    for name, result in current["results"].items():
+        if name not in baseline["results"]:
+            continue
+        old = baseline["results"][name]
+        if result["ops_per_sec"] < old["ops_per_sec"] * (1 - threshold):
+            regressions.append(f"{name}: {old['ops_per_sec']:.1f} -> {result['ops_per_sec']:.1f} ops/sec")
+        if result["allocated_bytes"] > old["allocated_bytes"] * (1 + threshold):
+            regressions.append(f"{name}: {old['allocated_bytes']} -> {result['allocated_bytes']} bytes")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=100, help="payload size used in every scenario")
+    parser.add_argument("--duration", type=float, default=0.5, help="seconds to spend on every scenario")
+    parser.add_argument("--min-rounds", type=int, default=20, help="minimum number of runs per scenario")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="only run this scenario")
+    parser.add_argument("--save", help="store the results as a JSON baseline")
+    parser.add_argument("--compare", help="compare the results to a JSON baseline")
+    parser.add_argument("--threshold", type=float, default=0.1, help="allowed regression, 0.1 is 10%%")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        # check the baseline before spending minutes on a run that can not be compared:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline["meta"]["size"] != args.size:
+            parser.error(f"{args.compare} was measured with --size {baseline['meta']['size']}, not {args.size}")
+
+    current = run(args.size, args.duration, args.min_rounds, args.scenario)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(current, f, indent=2)
+    if baseline is not None:
+        regressions = compare(current, baseline, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,416 @@
+"""
+Checking for overlapping IP addresses without comparing every pair.
+
+In example 07, 'check_ipv4_overlap' uses 'itertools.combinations' to compare every address
+with every other address. That is fine for a handful of interfaces, but it is quadratic and
+it only looks at a single device.
+
+IP prefixes have a nice property: two prefixes either do not overlap at all, or one of them
+contains the other. So if we sort the prefixes on their first address (and put the larger
+prefix first when they start at the same address), we can walk the list once while keeping
+a stack of the prefixes that contain the current one. Everything on that stack overlaps with
+the current prefix, everything that was popped never will again.
+
+In this example, I use that idea to:
+- build a 'PrefixIndex' that supports add, remove and query for IPv4 and IPv6 networks
+- report every overlapping pair in O(n log n) (plus the number of overlaps that are found)
+- use the index inside the model_validator of the NetworkDevice
+- use the index as a network-wide validator that is updated every time a device is added
+
+The sorted keys are kept in chunks of at most a few thousand keys. Inserting into a single
+sorted list moves every key after it, which makes building an index of a whole fleet
+quadratic. With chunks, an insert only moves the keys of one chunk.
+"""
+from bisect import bisect_left, insort
+import ipaddress
+import itertools
+import random
+import time
+import timeit
+from typing import Any, Dict, Hashable, Iterator, List, NamedTuple, Tuple, Union
+
+from pydantic import BaseModel, ValidationError, model_validator
+
+
+IPNetwork = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+IPInput = Union[str, IPNetwork, ipaddress.IPv4Interface, ipaddress.IPv6Interface]
+
+
+def to_network(value: IPInput) -> IPNetwork:
+    """
+    Turn a string, an interface or a network into the network it belongs to.
+
+    Examples:
+    >>> to_network("1.1.1.1/24") -> IPv4Network('1.1.1.0/24')
+    >>> to_network(ipaddress.IPv6Interface("2001:db8::1/64")) -> IPv6Network('2001:db8::/64')
+    """
+    if isinstance(value, (ipaddress.IPv4Interface, ipaddress.IPv6Interface)):
+        return value.network
+    return ipaddress.ip_network(value, strict=False)
+
+
+SortKey = Tuple[int, int, int]
+
+
+def _sort_key(network: IPNetwork) -> SortKey:
+    """
+    Sort on IP version, then on the first address, then on the size of the prefix (largest first).
+    """
+    return (
+        network.version,
+        int(network.network_address),
+        -int(network.broadcast_address),
+    )
+
+
+class _SortedKeys:
+    """
+    A sorted list of unique keys, stored as a list of sorted chunks.
+    """
+
+    _LOAD = 1000  # a chunk is split in two when it grows beyond twice this size
+
+    def __init__(self) -> None:
+        self._chunks: List[List[SortKey]] = []
+        self._maxes: List[SortKey] = []  # the last key of every chunk
+
+    def __len__(self) -> int:
+        return sum(map(len, self._chunks))
+
+    def __iter__(self) -> Iterator[SortKey]:
+        return itertools.chain.from_iterable(self._chunks)
+
+    def add(self, key: SortKey) -> None:
+        if not self._chunks:
+            self._chunks.append([key])
+            self._maxes.append(key)
+            return
+        position = bisect_left(self._maxes, key)
+        if position == len(self._maxes):
+            position -= 1
+            chunk = self._chunks[position]
+            chunk.append(key)
+            self._maxes[position] = key
+        else:
+            chunk = self._chunks[position]
+            insort(chunk, key)
+        if len(chunk) > 2 * self._LOAD:
+            self._chunks[position : position + 1] = [chunk[: self._LOAD], chunk[self._LOAD :]]
+            self._maxes[position : position + 1] = [chunk[self._LOAD - 1], chunk[-1]]
+
+    def remove(self, key: SortKey) -> None:
+        position = bisect_left(self._maxes, key)
+        chunk = self._chunks[position]
+        del chunk[bisect_left(chunk, key)]
+        if chunk:
+            self._maxes[position] = chunk[-1]
+        else:
+            del self._chunks[position]
+            del self._maxes[position]
+
+    def starting_at(self, key: SortKey) -> Iterator[SortKey]:
+        """
+        Yield the keys from the first key that is not smaller than key onwards.
+        """
+        position = bisect_left(self._maxes, key)
+        if position == len(self._maxes):
+            return
+        chunk = self._chunks[position]
+        for index in range(bisect_left(chunk, key), len(chunk)):
+            yield chunk[index]
+        for index in range(position + 1, len(self._chunks)):
+            yield from self._chunks[index]
+
+
+class Overlap(NamedTuple):
+    """
+    Two networks that overlap, together with the owners that registered them.
+    """
+
+    first_network: IPNetwork
+    first_owner: Hashable
+    second_network: IPNetwork
+    second_owner: Hashable
+
+
+class PrefixIndex:
+    """
+    A sorted index of IPv4 and IPv6 networks.
+
+    Every network is registered with an owner. The owner can be anything that is hashable,
+    like an interface name or a (hostname, interface name) tuple.
+    """
+
+    def __init__(self) -> None:
+        self._owners: Dict[IPNetwork, List[Hashable]] = {}
+        self._keys = _SortedKeys()
+        self._networks: Dict[SortKey, IPNetwork] = {}
+
+    def __len__(self) -> int:
+        return sum(len(owners) for owners in self._owners.values())
+
+    def add(self, network: IPInput, owner: Hashable) -> None:
+        """
+        Register a network for an owner.
+        """
+        network = to_network(network)
+        if network not in self._owners:
+            key = _sort_key(network)
+            self._keys.add(key)
+            self._networks[key] = network
+            self._owners[network] = []
+        self._owners[network].append(owner)
+
+    def remove(self, network: IPInput, owner: Hashable) -> None:
+        """
+        Remove a network that was registered for an owner.
+
+        Raises a KeyError in case the owner never registered the network.
+        """
+        network = to_network(network)
+        owners = self._owners.get(network, [])
+        if owner not in owners:
+            raise KeyError(f"{network} is not registered for {owner}")
+        owners.remove(owner)
+        if not owners:
+            key = _sort_key(network)
+            self._keys.remove(key)
+            del self._networks[key]
+            del self._owners[network]
+
+    def query(self, network: IPInput) -> List[Tuple[IPNetwork, Hashable]]:
+        """
+        Return all the (network, owner) pairs in the index that overlap with the network.
+
+        Overlapping networks are either supernets of the network, of which there are at most
+        32 (or 128 for IPv6), or they are contained in the network, in which case they sit
+        right after it in the sorted index.
+        """
+        network = to_network(network)
+        found = []
+        for prefixlen in range(network.prefixlen):
+            supernet = network.supernet(new_prefix=prefixlen)
+            for owner in self._owners.get(supernet, []):
+                found.append((supernet, owner))
+        version, first, _ = _sort_key(network)
+        last = int(network.broadcast_address)
+        for key in self._keys.starting_at((version, first, -last)):
+            if key[0] != version or key[1] > last:
+                break
+            subnet = self._networks[key]
+            for owner in self._owners[subnet]:
+                found.append((subnet, owner))
+        return found
+
+    def overlaps(self) -> Iterator[Overlap]:
+        """
+        Yield every pair of overlapping networks in the index.
+
+        The sorted keys are walked once. The stack holds the networks that contain the
+        current network. Networks that end before the current network starts are popped,
+        they cannot overlap with anything that comes after.
+        """
+        stack: List[Tuple[int, int, IPNetwork]] = []
+        for key in self._keys:
+            version, first, negative_last = key
+            network = self._networks[key]
+            while stack and (stack[-1][0] != version or stack[-1][1] < first):
+                stack.pop()
+            owners = self._owners[network]
+            for owner_1, owner_2 in itertools.combinations(owners, 2):
+                yield Overlap(network, owner_1, network, owner_2)
+            for _, _, parent in stack:
+                for parent_owner in self._owners[parent]:
+                    for owner in owners:
+                        yield Overlap(parent, parent_owner, network, owner)
+            stack.append((version, -negative_last, network))
+
+
+class Interface(BaseModel):
+    """
+    An interface on a NetworkDevice
+    """
+
+    interface_name: str
+    ipv4: Union[ipaddress.IPv4Interface, None] = None
+    ipv6: Union[ipaddress.IPv6Interface, None] = None
+
+
+class NetworkDevice(BaseModel):
+    """
+    Representation of a NetworkDevice
+    """
+
+    fqdn_name: str
+    hostname: str
+    role: str
+    username: str
+    password: str
+    site: str
+    mgmt_ip: ipaddress.IPv4Interface
+    interfaces: List[Interface] = []
+
+    def addresses(self) -> Iterator[Tuple[str, Union[ipaddress.IPv4Interface, ipaddress.IPv6Interface]]]:
+        """
+        Yield the (interface name, address) of every address configured on the device.
+        """
+        yield "mgmt_ip", self.mgmt_ip
+        for interface in self.interfaces:
+            if interface.ipv4 is not None:
+                yield interface.interface_name, interface.ipv4
+            if interface.ipv6 is not None:
+                yield interface.interface_name, interface.ipv6
+
+    @model_validator(mode="after")
+    def check_ip_overlap(self):
+        """
+        Same check as 'check_ipv4_overlap' in example 07, but using the PrefixIndex.
+
+        This also checks the IPv6 addresses.
+        """
+        seen = set()
+        index = PrefixIndex()
+        for interface_name, address in self.addresses():
+            if address in seen:
+                raise ValueError(f"duplicate IP on interface {interface_name}")
+            seen.add(address)
+            index.add(address, interface_name)
+        for overlap in index.overlaps():
+            raise ValueError(
+                f"Overlapping IPs detected:{overlap.first_network} and {overlap.second_network}"
+            )
+        return self
+
+
+class NetworkOverlapValidator:
+    """
+    Validate that no two devices in the network use overlapping IP addresses.
+
+    Devices are checked against the index when they are added, so the network stays
+    valid as it grows and we never have to look at all the devices again.
+    """
+
+    def __init__(self) -> None:
+        self.index = PrefixIndex()
+
+    def add_device(self, device: NetworkDevice) -> None:
+        """
+        Add a device to the network.
+
+        Raises a ValueError, and leaves the index untouched, when one of the addresses of the
+        device overlaps with an address that is already in use in the network.
+        """
+        for interface_name, address in device.addresses():
+            for network, (hostname, other_interface) in self.index.query(address):
+                raise ValueError(
+                    f"{device.hostname} {interface_name} {address.network} overlaps with "
+                    f"{hostname} {other_interface} {network}"
+                )
+        for interface_name, address in device.addresses():
+            self.index.add(address, (device.hostname, interface_name))
+
+    def remove_device(self, device: NetworkDevice) -> None:
+        """
+        Remove a device, and all its addresses, from the network.
+        """
+        for interface_name, address in device.addresses():
+            self.index.remove(address, (device.hostname, interface_name))
+
+
+class Network(BaseModel):
+    """
+    All the devices in a network.
+    """
+
+    devices: List[NetworkDevice] = []
+
+    @model_validator(mode="after")
+    def check_network_wide_overlap(self):
+        """
+        Feed all the devices into a NetworkOverlapValidator.
+        """
+        validator = NetworkOverlapValidator()
+        for device in self.devices:
+            validator.add_device(device)
+        return self
+
+
+def router(hostname: str, mgmt_ip: str, interfaces: Union[List[Dict[str, Any]], None] = None) -> Dict[str, Any]:
+    return {
+        "hostname": hostname,
+        "fqdn_name": f"{hostname}.example.com",
+        "role": "dar",
+        "username": "said",
+        "password": "lovely",
+        "site": "dal09",
+        "mgmt_ip": mgmt_ip,
+        "interfaces": interfaces or [],
+    }
+
+
+# the same checks as in example 07:
+routers = [
+    router("router-3", "1.1.1.1/32", [{"interface_name": "some_name", "ipv4": "2.0.0.0/30"}]),
+    router("router-5", "1.1.1.1/32", [{"interface_name": "duplicate_ip", "ipv4": "1.1.1.1/32"}]),
+    router("router-6", "1.1.1.1/32", [{"interface_name": "overlap", "ipv4": "1.1.1.0/30"}]),
+    router("router-7", "1.1.1.1/32", [{"interface_name": "v6", "ipv6": "2001:db8::1/64"},
+                                      {"interface_name": "v6_overlap", "ipv6": "2001:db8::/48"}]),
+]
+for device_data in routers:
+    try:
+        device = NetworkDevice(**device_data)
+        print(f"{device.hostname} instantiated succesfully!\n")
+    except ValidationError as e:
+        print(f"{device_data['hostname']} instantiation failed:\n")
+        print(e, "\n")
+
+
+# network-wide, incrementally:
+validator = NetworkOverlapValidator()
+validator.add_device(NetworkDevice(**router("router-1", "10.0.0.1/32")))
+validator.add_device(NetworkDevice(**router("router-2", "10.0.0.2/32")))
+try:
+    validator.add_device(NetworkDevice(**router("router-3", "10.1.0.3/32", [
+        {"interface_name": "et-0/0/0", "ipv4": "10.0.0.0/30"},
+    ])))
+except ValueError as e:
+    print(e)
+"""
+router-3 et-0/0/0 10.0.0.0/30 overlaps with router-1 mgmt_ip 10.0.0.1/32
+"""
+
+# or as a model:
+try:
+    Network(devices=[router("router-1", "10.0.0.1/32"), router("router-2", "10.0.0.1/32")])
+except ValidationError as e:
+    print(e)
+
+
+# comparing the pairwise check from example 07 to the index:
+addresses = [ipaddress.IPv4Interface(f"10.{i // 256}.{i % 256}.0/31") for i in range(1000)]
+
+
+def pairwise() -> None:
+    for ip1, ip2 in itertools.combinations(addresses, 2):
+        ip1.network.overlaps(ip2.network)
+
+
+def indexed() -> None:
+    index = PrefixIndex()
+    for number, address in enumerate(addresses):
+        index.add(address, number)
+    for _ in index.overlaps():
+        pass
+
+
+print(f"pairwise check for {len(addresses)} addresses: {timeit.timeit(pairwise, number=1):.4f}s")
+print(f"indexed check for {len(addresses)} addresses:  {timeit.timeit(indexed, number=1):.4f}s")
+
+# building the index of a whole fleet, with the addresses in random order:
+for count in (100_000, 400_000):
+    fleet = [ipaddress.IPv4Network((i * 2, 31)) for i in random.Random(42).sample(range(2**24), count)]
+    start = time.perf_counter()
+    index = PrefixIndex()
+    for number, network in enumerate(fleet):
+        index.add(network, number)
+    print(f"adding {count} networks to the index: {time.perf_counter() - start:.2f}s")
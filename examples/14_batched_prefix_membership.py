@@ -0,0 +1,185 @@
+"""
+Checking millions of 'is prefix A inside prefix B' questions in one go.
+
+'check_network_membership' in example 07 parses both strings with 'ipaddress.ip_network'
+every time it is called and it compares a single pair at a time.
+
+In this example, I:
+- cache the parsing of a prefix, so the same string is only parsed once
+- store the prefixes in integer arrays (version, high 64 bits, low 64 bits and prefix length)
+- answer the membership question for entire arrays at once using NumPy
+
+An IPv6 address does not fit in a NumPy integer, so every address is split into two
+unsigned 64 bit halves. IPv4 addresses only use the lower half.
+
+This example requires NumPy:
+pip install numpy
+"""
+from functools import lru_cache
+import ipaddress
+import timeit
+from typing import Iterable, NamedTuple, Tuple, Union
+
+import numpy as np
+
+
+Prefix = Union[str, ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+_MASK_64 = (1 << 64) - 1
+
+
+def check_network_membership(
+    network_1: Union[str, ipaddress.IPv4Network],
+    network_2: Union[str, ipaddress.IPv4Network],
+) -> bool:
+    """
+    The per-pair function from example 07, without the print, used in the benchmark below.
+    """
+    return ipaddress.ip_network(network_2).overlaps(ipaddress.ip_network(network_1))
+
+
+@lru_cache(maxsize=65536)
+def parse_prefix(prefix: Prefix) -> Tuple[int, int, int, int]:
+    """
+    Parse a prefix into (version, high 64 bits, low 64 bits, prefix length).
+
+    Examples:
+    >>> parse_prefix("1.0.0.0/24") -> (4, 0, 16777216, 24)
+    >>> parse_prefix("2001:db8::/32") -> (6, 2306139568115548160, 0, 32)
+    """
+    network = ipaddress.ip_network(prefix, strict=False)
+    address = int(network.network_address)
+    return network.version, address >> 64, address & _MASK_64, network.prefixlen
+
+
+def _masks(version: np.ndarray, prefixlen: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Turn prefix lengths into the (high, low) netmask halves.
+
+    An IPv4 /24 lives in the low half, so it has the same mask as an IPv6 /120.
+    """
+    bits = prefixlen.astype(np.int64) + np.where(version == 4, 96, 0)
+    high_bits = np.clip(bits, 0, 64).astype(np.uint64)
+    low_bits = np.clip(bits - 64, 0, 64).astype(np.uint64)
+    all_ones = np.uint64(_MASK_64)
+    with np.errstate(over="ignore"):
+        # shifting a 64 bit number by 64 is undefined, so those are special cased:
+        high = np.where(high_bits == 0, np.uint64(0), all_ones << (np.uint64(64) - high_bits))
+        low = np.where(low_bits == 0, np.uint64(0), all_ones << (np.uint64(64) - low_bits))
+    return high, low
+
+
+class PrefixArray(NamedTuple):
+    """
+    A batch of prefixes stored as integer arrays.
+    """
+
+    version: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    prefixlen: np.ndarray
+    mask_high: np.ndarray
+    mask_low: np.ndarray
+
+    @classmethod
+    def from_prefixes(cls, prefixes: Iterable[Prefix]) -> "PrefixArray":
+        parsed = [parse_prefix(prefix) for prefix in prefixes]
+        version = np.array([p[0] for p in parsed], dtype=np.uint8)
+        high = np.array([p[1] for p in parsed], dtype=np.uint64)
+        low = np.array([p[2] for p in parsed], dtype=np.uint64)
+        prefixlen = np.array([p[3] for p in parsed], dtype=np.uint8)
+        mask_high, mask_low = _masks(version, prefixlen)
+        return cls(version, high, low, prefixlen, mask_high, mask_low)
+
+    def __len__(self) -> int:
+        return len(self.version)
+
+
+def _as_array(prefixes: Union[PrefixArray, Iterable[Prefix]]) -> PrefixArray:
+    if isinstance(prefixes, PrefixArray):
+        return prefixes
+    return PrefixArray.from_prefixes(prefixes)
+
+
+def membership_mask(
+    networks_1: Union[PrefixArray, Iterable[Prefix]],
+    networks_2: Union[PrefixArray, Iterable[Prefix]],
+) -> np.ndarray:
+    """
+    Check, pair by pair, if networks_1[i] is in networks_2[i].
+
+    Examples:
+    >>> membership_mask(["2.2.2.2/32", "1.0.0.2/32"], ["1.0.0.0/24", "1.0.0.0/24"])
+    array([False,  True])
+    """
+    a, b = _as_array(networks_1), _as_array(networks_2)
+    if len(a) != len(b):
+        raise ValueError(f"cannot compare {len(a)} networks with {len(b)} networks pair by pair")
+    return (
+        (a.version == b.version)
+        & (a.prefixlen >= b.prefixlen)
+        & ((a.high & b.mask_high) == b.high)
+        & ((a.low & b.mask_low) == b.low)
+    )
+
+
+def membership_matrix(
+    networks_1: Union[PrefixArray, Iterable[Prefix]],
+    networks_2: Union[PrefixArray, Iterable[Prefix]],
+) -> np.ndarray:
+    """
+    Check every network in networks_1 against every network in networks_2.
+
+    Returns a boolean matrix where matrix[i, j] tells you if networks_1[i] is in networks_2[j].
+
+    Examples:
+    >>> membership_matrix(["1.0.0.2/32", "2001:db8::1/128"], ["1.0.0.0/24", "2001:db8::/32", "0.0.0.0/0"])
+    array([[ True, False,  True],
+           [False,  True, False]])
+    """
+    a, b = _as_array(networks_1), _as_array(networks_2)
+    return (
+        (a.version[:, None] == b.version[None, :])
+        & (a.prefixlen[:, None] >= b.prefixlen[None, :])
+        & ((a.high[:, None] & b.mask_high[None, :]) == b.high[None, :])
+        & ((a.low[:, None] & b.mask_low[None, :]) == b.low[None, :])
+    )
+
+
+print(membership_mask(["2.2.2.2/32", "1.0.0.2/32"], ["1.0.0.0/24", "1.0.0.0/24"]))
+print(membership_matrix(["1.0.0.2/32", "2001:db8::1/128"], ["1.0.0.0/24", "2001:db8::/32", "0.0.0.0/0"]))
+
+
+# comparing the per-pair function from example 07 to the batched version:
+hosts = [f"10.{i // 256 % 256}.{i % 256}.1/32" for i in range(200)]
+aggregates = [f"10.{i}.0.0/16" for i in range(0, 256, 2)]
+pairs = len(hosts) * len(aggregates)
+
+
+def per_pair() -> None:
+    for host in hosts:
+        for aggregate in aggregates:
+            check_network_membership(host, aggregate)
+
+
+def batched() -> None:
+    membership_matrix(hosts, aggregates)
+
+
+host_array, aggregate_array = PrefixArray.from_prefixes(hosts), PrefixArray.from_prefixes(aggregates)
+
+
+def batched_preparsed() -> None:
+    membership_matrix(host_array, aggregate_array)
+
+
+# sanity check, for prefixes 'overlaps' and 'in' are the same thing when the first is the smaller one:
+matrix = membership_matrix(hosts, aggregates)
+assert all(
+    matrix[i, j] == check_network_membership(host, aggregate)
+    for i, host in enumerate(hosts)
+    for j, aggregate in enumerate(aggregates)
+)
+print(f"per pair, {pairs} checks:          {timeit.timeit(per_pair, number=1):.4f}s")
+print(f"batched, {pairs} checks:           {timeit.timeit(batched, number=1):.4f}s")
+print(f"batched and preparsed, {pairs} checks: {timeit.timeit(batched_preparsed, number=1):.4f}s")
@@ -0,0 +1,143 @@
+"""
+Streaming multi-document YAML and NDJSON files into models.
+
+In example 02, we create a Human from 'yaml.safe_load' on a single YAML string. When the
+input is a file with millions of documents, loading it all at once will eat all your memory.
+
+In this example, I use generators to read one document at a time and turn it into a model:
+- 'yaml.load_all' parses the next document only when we ask for it
+- the C libyaml loader is used when PyYAML was built with it, it is a lot faster
+- NDJSON is read line by line and handed to 'model_validate_json' directly
+- a bad record does not abort the stream, it is yielded as an error instead
+
+Memory use stays the same regardless of the size of the file.
+"""
+import os
+import tempfile
+from typing import Generic, IO, Iterator, NamedTuple, Optional, Type, TypeVar, Union
+
+from pydantic import BaseModel, ValidationError
+import yaml
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+
+ModelType = TypeVar("ModelType", bound=BaseModel)
+
+
+class Record(NamedTuple, Generic[ModelType]):
+    """
+    The outcome of loading a single document.
+
+    Either model or error is set. The position is the index of the document in the stream
+    for YAML, and the line number for NDJSON.
+    """
+
+    position: int
+    model: Optional[ModelType]
+    error: Optional[Exception]
+
+
+def stream_yaml(stream: Union[str, IO], model: Type[ModelType]) -> Iterator[Record[ModelType]]:
+    """
+    Yield a Record for every document in a multi-document YAML stream.
+
+    A document that fails validation is yielded as an error. A document that is not even
+    valid YAML ends the stream, as the parser cannot find the start of the next document.
+    """
+    documents = yaml.load_all(stream, Loader=SafeLoader)
+    position = 0
+    while True:
+        try:
+            document = next(documents)
+        except StopIteration:
+            return
+        except yaml.YAMLError as err:
+            yield Record(position, None, err)
+            return
+        if document is not None:
+            try:
+                yield Record(position, model.model_validate(document), None)
+            except ValidationError as err:
+                yield Record(position, None, err)
+        position += 1
+
+
+def stream_ndjson(stream: IO, model: Type[ModelType]) -> Iterator[Record[ModelType]]:
+    """
+    Yield a Record for every line in an NDJSON stream.
+
+    Every line is validated straight from JSON, so it is never turned into a dict first.
+    Empty lines are skipped.
+    """
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield Record(line_number, model.model_validate_json(line), None)
+        except ValidationError as err:
+            yield Record(line_number, None, err)
+
+
+class Suitcase(BaseModel):
+    items: list
+
+
+class Human(BaseModel):
+    name: str
+    age: int
+    suitcase: Optional[Suitcase]
+
+
+yaml_string = """
+---
+name: Janice
+age: 32
+suitcase:
+  items:
+    - gloves
+    - shoes
+---
+name: Jan
+age: six
+suitcase: null
+---
+name: Joe
+age: 6
+suitcase:
+  items: [comb, toothbrush]
+"""
+
+ndjson_string = (
+    '{"name": "Janice", "age": 32, "suitcase": {"items": ["gloves", "shoes"]}}\n'
+    '{"name": "Jan", "age": "six", "suitcase": null}\n'
+    "\n"
+    '{"name": "Joe", "age": 6, "suitcase": {"items": ["comb", "toothbrush"]}}\n'
+)
+
+with tempfile.TemporaryDirectory() as directory:
+    yaml_file = os.path.join(directory, "humans.yaml")
+    ndjson_file = os.path.join(directory, "humans.ndjson")
+    with open(yaml_file, "w") as f:
+        f.write(yaml_string)
+    with open(ndjson_file, "w") as f:
+        f.write(ndjson_string)
+
+    print(f"loading YAML with {SafeLoader.__name__}:")
+    with open(yaml_file) as f:
+        for record in stream_yaml(f, Human):
+            if record.error:
+                print(f"document {record.position} failed:\n{record.error}")
+            else:
+                print(f"document {record.position}: {record.model}")
+
+    print("loading NDJSON:")
+    with open(ndjson_file) as f:
+        for record in stream_ndjson(f, Human):
+            if record.error:
+                print(f"line {record.position} failed:\n{record.error}")
+            else:
+                print(f"line {record.position}: {record.model}")
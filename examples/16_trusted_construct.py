@@ -0,0 +1,218 @@
+"""
+Building nested models from trusted data, without running any validation.
+
+In example 02, we saw that 'model_construct' skips validation, but it also leaves the nested
+'suitcase' as a dict. When the data comes from a place we trust, like our own database that
+only ever stores validated data, we want the speed of 'model_construct' and the nested types
+of 'model_validate'.
+
+In this example, I look at the annotation of every field once and turn it into a 'builder'
+function. Building a model is then a matter of running the builder for every field and
+setting the results on a new instance, just like 'model_construct' does:
+- a nested BaseModel is built with its own builders
+- List, Tuple, Set and Dict build every item
+- Optional and Union with None pass None through
+- Enums, IP addresses, UUIDs and the like are built by calling the type
+
+The builders are cached per class, so the annotations are only looked at once.
+
+Do not use this on data you do not trust: no validator runs and bad data ends up in the model.
+"""
+from enum import Enum
+import ipaddress
+import itertools
+import timeit
+import types
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type, TypeVar, Union, get_args, get_origin
+from uuid import UUID
+
+from pydantic import BaseModel, model_validator
+from pydantic.fields import FieldInfo
+
+
+ModelType = TypeVar("ModelType", bound=BaseModel)
+Builder = Callable[[Any], Any]
+
+_plans: Dict[Type[BaseModel], "_Plan"] = {}
+
+_CALLABLE_TYPES = (
+    UUID,
+    ipaddress.IPv4Address,
+    ipaddress.IPv6Address,
+    ipaddress.IPv4Interface,
+    ipaddress.IPv6Interface,
+    ipaddress.IPv4Network,
+    ipaddress.IPv6Network,
+)
+
+
+def _identity(value: Any) -> Any:
+    return value
+
+
+def _builder(annotation: Any) -> Builder:
+    """
+    Turn a type annotation into a function that builds a value of that type.
+    """
+    origin = get_origin(annotation)
+    args = get_args(annotation)
+
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return lambda value: value if isinstance(value, annotation) else trusted_construct(annotation, value)
+
+    if isinstance(annotation, type) and issubclass(annotation, (Enum,) + _CALLABLE_TYPES):
+        return lambda value: value if isinstance(value, annotation) else annotation(value)
+
+    if origin in (Union, types.UnionType):
+        members = [arg for arg in args if arg is not type(None)]
+        if len(members) != 1:
+            # we cannot tell which member of the Union the data was meant for without validating
+            return _identity
+        build_member = _builder(members[0])
+        return lambda value: None if value is None else build_member(value)
+
+    if origin in (list, set, frozenset) and args:
+        build_item = _builder(args[0])
+        return lambda value: origin(build_item(item) for item in value)
+
+    if origin is tuple and args:
+        if len(args) == 2 and args[1] is Ellipsis:
+            build_item = _builder(args[0])
+            return lambda value: tuple(build_item(item) for item in value)
+        build_items = [_builder(arg) for arg in args]
+        return lambda value: tuple(build(item) for build, item in zip(build_items, value))
+
+    if origin is dict and args:
+        build_key, build_value = _builder(args[0]), _builder(args[1])
+        return lambda value: {build_key(k): build_value(v) for k, v in value.items()}
+
+    return _identity
+
+
+class _Plan:
+    """
+    Everything we need to know to build a model, worked out once per class.
+    """
+
+    def __init__(self, model: Type[BaseModel]) -> None:
+        self.builders: Dict[str, Tuple[str, Builder]] = {}
+        self.defaults: List[Tuple[str, FieldInfo]] = []
+        # models with private attributes or extra fields need the full 'model_construct':
+        self.simple = not model.__private_attributes__ and model.model_config.get("extra") != "allow"
+        for name, field in model.model_fields.items():
+            builder = _builder(field.annotation)
+            self.builders[name] = (name, builder)
+            if field.alias is not None:
+                self.builders[field.alias] = (name, builder)
+            if not field.is_required():
+                self.defaults.append((name, field))
+
+
+def _plan(model: Type[BaseModel]) -> _Plan:
+    plan = _plans.get(model)
+    if plan is None:
+        plan = _plans[model] = _Plan(model)
+    return plan
+
+
+def trusted_construct(model: Type[ModelType], data: Dict[str, Any]) -> ModelType:
+    """
+    Create an instance of model, including all the nested models, without validation.
+
+    This does what 'model_construct' does, setting the instance attributes directly, but it
+    skips the per-call work 'model_construct' does to figure out aliases and defaults.
+    Keys that are not fields of the model are dropped, like 'model_construct' does by default.
+    """
+    plan = _plan(model)
+    values = {}
+    for key, value in data.items():
+        if key in plan.builders:
+            name, build = plan.builders[key]
+            values[name] = build(value)
+    if not plan.simple:
+        return model.model_construct(**values)
+    fields_set = set(values)
+    for name, field in plan.defaults:
+        if name not in values:
+            values[name] = field.get_default(call_default_factory=True, validated_data=values)
+    instance = model.__new__(model)
+    object.__setattr__(instance, "__dict__", values)
+    object.__setattr__(instance, "__pydantic_fields_set__", fields_set)
+    object.__setattr__(instance, "__pydantic_extra__", None)
+    object.__setattr__(instance, "__pydantic_private__", None)
+    return instance
+
+
+class Suitcase(BaseModel):
+    items: list
+
+
+class Human(BaseModel):
+    name: str
+    age: int
+    suitcase: Optional[Suitcase]
+
+
+input_d = {"name": "marie", "age": 2, "suitcase": {"items": ["comb", "toothbrush"]}}
+marie = Human.model_construct(**input_d)
+print(f"model_construct: {type(marie.suitcase)}")
+marie = trusted_construct(Human, input_d)
+print(f"trusted_construct: {type(marie.suitcase)}")
+"""
+model_construct: <class 'dict'>
+trusted_construct: <class '__main__.Suitcase'>
+"""
+
+
+class Os(Enum):
+    EOS = "eos"
+    JUNOS = "junos"
+    IOSXE = "iosxe"
+
+
+class Interface(BaseModel):
+    interface_name: str
+    ipv4: Union[ipaddress.IPv4Interface, None] = None
+
+
+class NetworkDevice(BaseModel):
+    hostname: str
+    os: Os
+    mgmt_ip: ipaddress.IPv4Interface
+    interfaces: List[Interface] = []
+
+    @model_validator(mode="after")
+    def check_ipv4_overlap(self):
+        """
+        The pairwise check from example 07, this is the work we skip for trusted data.
+        """
+        all_ip_addresses = [self.mgmt_ip] + [i.ipv4 for i in self.interfaces if i.ipv4]
+        for ip1, ip2 in itertools.combinations(all_ip_addresses, 2):
+            if ip1.network.overlaps(ip2.network):
+                raise ValueError(f"Overlapping IPs detected:{ip1.network} and {ip2.network}")
+        return self
+
+
+device_d = {
+    "hostname": "router-1",
+    "os": "junos",
+    "mgmt_ip": "1.1.1.1/32",
+    "interfaces": [{"interface_name": f"et-0/0/{i}", "ipv4": f"10.0.{i}.0/31"} for i in range(48)],
+}
+device = trusted_construct(NetworkDevice, device_d)
+assert device == NetworkDevice.model_validate(device_d)
+print(device.os, repr(device.mgmt_ip), repr(device.interfaces[0]))
+
+
+# The validation of Pydantic v2 itself happens in Rust, and it is hard to beat from Python. For the
+# Human, 'model_validate' is actually faster than building it ourselves. What we save with
+# trusted_construct is the validators we wrote in Python, like 'check_ipv4_overlap':
+human_d = {"name": "marie", "age": 2, "suitcase": {"items": ["comb", "toothbrush"]}}
+number = 2000
+for label, model, data in [("devices", NetworkDevice, device_d), ("humans", Human, human_d)]:
+    for name, function in [
+        ("model_validate", lambda: model.model_validate(data)),
+        ("model_construct", lambda: model.model_construct(**data)),
+        ("trusted_construct", lambda: trusted_construct(model, data)),
+    ]:
+        print(f"{name:<18} {number / timeit.timeit(function, number=number):>10.0f} {label}/sec")
@@ -0,0 +1,169 @@
+"""
+Caching models that are created at runtime.
+
+In example 08, we create a model with 'create_model'. Building a model is expensive, as
+Pydantic has to work out the schema and the validator for it. When we create a model for
+every tenant, from field specs that are mostly the same, we rebuild the same class over and
+over again and every one of those classes stays in memory.
+
+In this example, I put a factory in front of 'create_model' that:
+- normalizes the field spec, so 'int' and '(int, ...)' are the same thing
+- passes the options of 'create_model', like '__config__' and '__base__', on as they are
+- returns the class it created earlier when it sees the same name and field spec again
+- keeps at most 'maxsize' classes around, evicting the least recently used one
+- counts the hits, misses and evictions
+"""
+from collections import OrderedDict
+import timeit
+from typing import Any, Dict, Hashable, NamedTuple, Tuple, Type
+
+from pydantic import BaseModel, ConfigDict, create_model
+from pydantic.fields import FieldInfo
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    maxsize: int
+    currsize: int
+
+
+def _hashable(value: Any) -> Hashable:
+    """
+    Defaults can be lists or dicts. Those are not hashable, so we use the repr instead.
+
+    The same goes for 'Field(...)', two identical Fields are not equal to each other.
+
+    The type is part of the key, because 0 == False and 1 == 1.0 while they are different defaults.
+    """
+    if isinstance(value, FieldInfo):
+        return (FieldInfo, repr(value))
+    if type(value) is tuple:
+        return (tuple, tuple(map(_hashable, value)))
+    try:
+        hash(value)
+    except TypeError:
+        return (type(value), repr(value))
+    return (type(value), value)
+
+
+def _normalize(fields: Dict[str, Any]) -> Tuple[Tuple[str, Hashable, Hashable], ...]:
+    """
+    Turn a field spec into a tuple that can be used as a key in a dict.
+
+    A field is either a type, in which case it is required, or a (type, default) tuple.
+    The order of the fields is kept, as it is also the order in which fields are serialized.
+    """
+    normalized = []
+    for name, spec in fields.items():
+        annotation, default = spec if isinstance(spec, tuple) else (spec, ...)
+        normalized.append((name, _hashable(annotation), _hashable(default)))
+    return tuple(normalized)
+
+
+class _Identity:
+    """
+    A key that is only equal to the same object, for options like '__base__' and '__validators__'.
+    """
+
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any) -> None:
+        self.value = value
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, _Identity) and other.value is self.value
+
+    def __hash__(self) -> int:
+        return id(self.value)
+
+
+def _option_key(name: str, value: Any) -> Hashable:
+    if name == "__config__" and isinstance(value, dict):
+        return tuple(sorted((key, _hashable(item)) for key, item in value.items()))
+    if name == "__validators__" and isinstance(value, dict):
+        return tuple(sorted((key, _Identity(item)) for key, item in value.items()))
+    if name == "__base__":
+        return _Identity(value)
+    return _hashable(value)
+
+
+class DynamicModelFactory:
+    """
+    Create models at runtime and cache them on their name and their normalized field spec.
+    """
+
+    def __init__(self, maxsize: int = 128) -> None:
+        self.maxsize = maxsize
+        self._cache: "OrderedDict[Hashable, Type[BaseModel]]" = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def create(self, model_name: str, **fields: Any) -> Type[BaseModel]:
+        """
+        Like 'create_model', the keyword arguments that start with '__' are its options.
+        """
+        options = {name: fields.pop(name) for name in list(fields) if name.startswith("__")}
+        key = (
+            model_name,
+            _normalize(fields),
+            tuple(sorted((name, _option_key(name, value)) for name, value in options.items())),
+        )
+        model = self._cache.get(key)
+        if model is not None:
+            self._hits += 1
+            self._cache.move_to_end(key)
+            return model
+        self._misses += 1
+        model = create_model(
+            model_name,
+            **options,
+            **{name: spec if isinstance(spec, tuple) else (spec, ...) for name, spec in fields.items()},
+        )
+        self._cache[key] = model
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+            self._evictions += 1
+        return model
+
+    def cache_info(self) -> CacheInfo:
+        return CacheInfo(self._hits, self._misses, self._evictions, self.maxsize, len(self._cache))
+
+    def cache_clear(self) -> None:
+        self._cache.clear()
+        self._hits = self._misses = self._evictions = 0
+
+
+factory = DynamicModelFactory(maxsize=2)
+
+DynamicModel = factory.create("DynamicModel", name=(str, ...), age=(int, ...))
+SameModel = factory.create("DynamicModel", name=str, age=int)
+print(f"same class returned: {DynamicModel is SameModel}")
+print(DynamicModel(name="Jan", age=8).model_dump_json())
+
+factory.create("TenantModel", name=str, tags=(list, []))
+factory.create("OtherTenantModel", name=str)
+print(factory.cache_info())
+
+# the options of create_model are passed on, and are part of the key:
+Strict = factory.create("DynamicModel", __config__=ConfigDict(extra="forbid"), name=str, age=int)
+print(f"same class as without config: {Strict is DynamicModel}, extra: {Strict.model_config['extra']}")
+Child = factory.create("Child", __base__=DynamicModel, school=str)
+print(Child(name="Jan", age=8, school="de Regenboog"))
+"""
+same class returned: True
+{"name":"Jan","age":8}
+CacheInfo(hits=1, misses=3, evictions=1, maxsize=2, currsize=2)
+same class as without config: False, extra: forbid
+name='Jan' age=8 school='de Regenboog'
+"""
+
+
+fields = {f"field_{i}": (int, i) for i in range(20)}
+factory = DynamicModelFactory()
+number = 200
+print(f"create_model:                {timeit.timeit(lambda: create_model('DynamicModel', **fields), number=number) / number * 1e6:.1f}us")
+print(f"DynamicModelFactory.create:  {timeit.timeit(lambda: factory.create('DynamicModel', **fields), number=number) / number * 1e6:.1f}us")
+print(factory.cache_info())
@@ -0,0 +1,219 @@
+"""
+Validating the arguments of many function calls at once.
+
+With '@validate_call' from example 12, every call validates its own arguments. Calling
+'extract_a_char' for millions of rows means going in and out of the Pydantic validator
+millions of times.
+
+In this example, I use a decorator that works like 'validate_call', but that also adds a
+'batch' method to the function. The batch method:
+- turns the signature of the function into a Tuple, once
+- validates an entire list of calls with a single 'TypeAdapter(List[Tuple[...]])'
+- calls the function for every row that passed validation
+- returns the results and the errors together with the position of the row
+
+A list that contains an invalid row fails as a whole. When that happens, we take the
+positions of the bad rows from the errors and validate the rest of the rows once more.
+
+Rows that are not a tuple or a dict, or that have arguments the function does not take, are
+rejected before validation, with the same errors 'validate_call' gives.
+"""
+from functools import wraps
+import inspect
+import timeit
+from typing import Annotated, Any, Callable, Dict, List, Literal, NamedTuple, Sequence, Tuple, Union
+
+from pydantic import BeforeValidator, Field, TypeAdapter, ValidationError, validate_call
+
+
+Row = Union[Tuple[Any, ...], Dict[str, Any]]
+
+_MISSING = object()
+
+
+class BatchResult(NamedTuple):
+    """
+    The (position, return value) of every valid call and the (position, errors) of every invalid one.
+    """
+
+    results: List[Tuple[int, Any]]
+    errors: List[Tuple[int, List[Dict[str, Any]]]]
+
+
+class _Arguments:
+    """
+    The arguments of a function, turned into a single TypeAdapter for a list of argument tuples.
+    """
+
+    def __init__(self, function: Callable) -> None:
+        self.names: List[str] = []
+        self.defaults: List[Any] = []
+        annotations = []
+        for name, parameter in inspect.signature(function).parameters.items():
+            if parameter.kind in (parameter.VAR_POSITIONAL, parameter.VAR_KEYWORD, parameter.KEYWORD_ONLY):
+                raise TypeError(f"batch_validate_call only supports positional arguments, found {name}")
+            self.names.append(name)
+            self.defaults.append(_MISSING if parameter.default is parameter.empty else parameter.default)
+            annotations.append(Any if parameter.annotation is parameter.empty else parameter.annotation)
+        self.adapter = TypeAdapter(List[Tuple[tuple(annotations)]])
+
+    def unexpected(self, row: Row) -> List[Dict[str, Any]]:
+        """
+        The errors for a row that is not a tuple or a dict, or that has arguments the function does not take.
+        """
+        if isinstance(row, dict):
+            return [
+                {"type": "unexpected_keyword_argument", "loc": (name,), "msg": "Unexpected keyword argument", "input": value}
+                for name, value in row.items()
+                if name not in self.names
+            ]
+        if isinstance(row, (tuple, list)):
+            return [
+                {
+                    "type": "unexpected_positional_argument",
+                    "loc": (index,),
+                    "msg": "Unexpected positional argument",
+                    "input": value,
+                }
+                for index, value in enumerate(row[len(self.names) :], len(self.names))
+            ]
+        return [
+            {"type": "arguments_type", "loc": (), "msg": "Arguments must be a tuple, list or a dictionary", "input": row}
+        ]
+
+    def to_tuple(self, row: Row) -> Tuple[Any, ...]:
+        """
+        Fill in the defaults for the arguments that are not in the row.
+        """
+        if isinstance(row, dict):
+            return tuple(row.get(name, default) for name, default in zip(self.names, self.defaults))
+        if len(row) < len(self.names):
+            return tuple(row) + tuple(self.defaults[len(row):])
+        return row
+
+    def missing(self, row: Tuple[Any, ...]) -> List[Dict[str, Any]]:
+        """
+        The errors for the required arguments that are not in the row, in the same format Pydantic uses.
+        """
+        passed = {name: value for name, value in zip(self.names, row) if value is not _MISSING}
+        return [
+            {"type": "missing_argument", "loc": (name,), "msg": "Missing required argument", "input": passed}
+            for name, value in zip(self.names, row)
+            if value is _MISSING
+        ]
+
+
+def batch_validate_call(function: Callable) -> Callable:
+    """
+    Decorate a function with 'validate_call' and add a 'batch' method to it.
+
+    Every row passed to batch is either a tuple (or list) of positional arguments or a dict of
+    keyword arguments. Defaults of the function are validated as well when they are used in a batch.
+    """
+    validated = validate_call(function)
+    arguments = _Arguments(function)
+
+    def batch(rows: Sequence[Row]) -> BatchResult:
+        positions: List[int] = []
+        candidates: List[Tuple[Any, ...]] = []
+        errors: Dict[int, List[Dict[str, Any]]] = {}
+        size = len(arguments.names)
+        for position, row in enumerate(rows):
+            if type(row) is tuple and len(row) == size:
+                positions.append(position)
+                candidates.append(row)
+                continue
+            unexpected = arguments.unexpected(row)
+            if unexpected:
+                errors[position] = unexpected
+                continue
+            row = arguments.to_tuple(row)
+            if _MISSING in row:
+                errors[position] = arguments.missing(row)
+                continue
+            positions.append(position)
+            candidates.append(row)
+        try:
+            valid = arguments.adapter.validate_python(candidates)
+        except ValidationError as err:
+            for error in err.errors():
+                index, *loc = error["loc"]
+                if loc:
+                    loc[0] = arguments.names[loc[0]]
+                error["loc"] = tuple(loc)
+                errors.setdefault(positions[index], []).append(error)
+            kept = [index for index, position in enumerate(positions) if position not in errors]
+            positions = [positions[index] for index in kept]
+            valid = arguments.adapter.validate_python([candidates[index] for index in kept])
+        results = [(position, function(*args)) for position, args in zip(positions, valid)]
+        return BatchResult(results, sorted(errors.items()))
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        return validated(*args, **kwargs)
+
+    wrapper.batch = batch
+    return wrapper
+
+
+NonEmptyString = Annotated[str, Field(min_length=1)]
+
+
+@batch_validate_call
+def extract_a_char(s: NonEmptyString) -> str:
+    return s[0]
+
+
+ActionType = Literal["START", "STOP"]
+
+
+@batch_validate_call
+def do_something(action: ActionType, times: int = 1) -> str:
+    return f"Performing action: {action} {times} times"
+
+
+print(extract_a_char("this works"))
+outcome = extract_a_char.batch([("this works",), ("",), {"s": "so does this"}])
+print(outcome.results)
+print(outcome.errors)
+"""
+[(0, 't'), (2, 's')]
+[(1, [{'type': 'string_too_short', 'loc': ('s',), 'msg': 'String should have at least 1 character', ...}])]
+"""
+print(do_something.batch([("START",), ("STOP", "3"), ("PAUSE",), {"times": 2}]))
+print(do_something.batch([("START", 1, "extra"), "START", {"action": "STOP", "verbose": True}]).errors)
+
+
+def validate_no_q(v: str) -> str:
+    """
+    Verify that the letter q does not appear in a string.
+    """
+    if "q" in v.lower():
+        raise ValueError("The string must not contain the letter 'q'")
+    return v
+
+
+NonEmptyStringExtended = Annotated[str, Field(min_length=1), BeforeValidator(validate_no_q)]
+
+
+@batch_validate_call
+def extract_another_char(s: NonEmptyStringExtended) -> str:
+    return s[0]
+
+
+def single_calls(rows: List[Tuple[str]]) -> None:
+    for (s,) in rows:
+        try:
+            extract_another_char(s)
+        except ValidationError:
+            pass
+
+
+clean_rows = [(f"string-{i}",) for i in range(20_000)]
+# a single bad row means the batch is validated twice:
+dirty_rows = clean_rows[:100] + [("quack",)] + clean_rows[101:]
+
+for label, rows in [("clean rows", clean_rows), ("one bad row", dirty_rows)]:
+    for name, function in [("single calls", single_calls), ("batch", extract_another_char.batch)]:
+        seconds = timeit.timeit(lambda: function(rows), number=3) / 3
+        print(f"{label:<12} {name:<13} {seconds / len(rows) * 1e9:>8.0f}ns per call")
@@ -0,0 +1,139 @@
+"""
+Fusing a chain of character and substring checks into a single validator.
+
+In example 12, 'NonEmptyStringExtended' stacks two BeforeValidators. Both lowercase the
+string and scan it. That is fine for two rules, but with ten rules on a hot field we lowercase
+and scan the same string ten times.
+
+In this example, I declare the rules as data instead of as functions. A single validator then
+lowercases the string once, checks all the forbidden characters in one go using a set, and
+checks the forbidden substrings with 'in'. Only when something is found do we look at the
+rules one by one, so the error message names the rule that failed.
+
+The rules are passed in the same order as the stacked BeforeValidators they replace. Pydantic runs
+stacked BeforeValidators from the last one to the first one, and so does the fused validator, so
+both report the same rule when a string breaks more than one.
+
+I also tried compiling all the rules into a single regex. Python's 're' tries every alternative
+at every position, which made it a lot slower than this.
+"""
+import timeit
+from typing import Annotated, List, NamedTuple, Tuple
+
+from pydantic import BeforeValidator, Field, TypeAdapter, ValidationError
+
+
+class Rule(NamedTuple):
+    """
+    Text that must not appear in the string, and the message to use when it does.
+    """
+
+    text: str
+    message: str
+
+
+def no_character(character: str) -> Rule:
+    return Rule(character.lower(), f"The string must not contain the letter '{character}'")
+
+
+def no_substring(substring: str) -> Rule:
+    return Rule(substring.lower(), f"The string must not contain '{substring}'")
+
+
+class FusedValidator:
+    """
+    Check a string against all the rules, lowercasing it only once. Like stacked BeforeValidators,
+    the last rule is checked first.
+
+    Use it like any other validator function:
+    Annotated[str, BeforeValidator(FusedValidator(no_character("q"), no_character("z")))]
+    """
+
+    def __init__(self, *rules: Rule) -> None:
+        self.rules = rules
+        self._checked = tuple(reversed(rules))
+        self.characters = frozenset(rule.text for rule in rules if len(rule.text) == 1)
+        self.substrings = tuple(rule.text for rule in rules if len(rule.text) > 1)
+
+    def __repr__(self) -> str:
+        return f"FusedValidator({', '.join(repr(rule.text) for rule in self.rules)})"
+
+    def __call__(self, v: str) -> str:
+        lowered = v.lower()
+        if self.characters.isdisjoint(lowered) and not any_in(self.substrings, lowered):
+            return v
+        for rule in self._checked:
+            if rule.text in lowered:
+                raise ValueError(rule.message)
+        return v
+
+
+def any_in(substrings: Tuple[str, ...], text: str) -> bool:
+    for substring in substrings:
+        if substring in text:
+            return True
+    return False
+
+
+def validate_no_q(v: str) -> str:
+    """
+    Verify that the letter q does not appear in a string.
+    """
+    if "q" in v.lower():
+        raise ValueError("The string must not contain the letter 'q'")
+    return v
+
+
+def validate_no_z(v: str) -> str:
+    """
+    Verify that the letter z does not appear in a string.
+    """
+    if "z" in v.lower():
+        raise ValueError("The string must not contain the letter 'z'")
+    return v
+
+
+NonEmptyStringExtended = Annotated[
+    str,
+    Field(min_length=1),
+    BeforeValidator(validate_no_q),
+    BeforeValidator(validate_no_z),
+]
+
+NonEmptyStringFused = Annotated[
+    str,
+    Field(min_length=1),
+    BeforeValidator(FusedValidator(no_character("q"), no_character("z"))),
+]
+
+for annotation in (NonEmptyStringExtended, NonEmptyStringFused):
+    try:
+        TypeAdapter(annotation).validate_python("aqz")
+    except ValidationError as err:
+        print(err)
+"""
+1 validation error for function-before[validate_no_z(), function-before[validate_no_q(), constrained-str]]
+  Value error, The string must not contain the letter 'z' [type=value_error, input_value='aqz', input_type=str]
+1 validation error for function-before[FusedValidator('q', 'z')(), constrained-str]
+  Value error, The string must not contain the letter 'z' [type=value_error, input_value='aqz', input_type=str]
+"""
+
+
+# comparing ten stacked validators to a single fused one:
+def stacked_rule(rule: Rule):
+    def validator(v: str) -> str:
+        if rule.text in v.lower():
+            raise ValueError(rule.message)
+        return v
+
+    return BeforeValidator(validator)
+
+
+rules = [no_character(c) for c in "qzxjk"] + [no_substring(s) for s in ("drop", "select", "--", "<script", "../")]
+stacked = TypeAdapter(List[Annotated[(str, *[stacked_rule(rule) for rule in rules])]])
+fused = TypeAdapter(List[Annotated[str, BeforeValidator(FusedValidator(*rules))]])
+values = [f"Some perfectly fine hostname number {i}" for i in range(10_000)]
+
+for name, adapter in [("stacked", stacked), ("fused", fused)]:
+    seconds = timeit.timeit(lambda: adapter.validate_python(values), number=5) / 5
+    print(f"{name:<8} {seconds / len(values) * 1e9:>8.0f}ns per value")
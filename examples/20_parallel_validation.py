@@ -0,0 +1,166 @@
+"""
+Validating a large inventory on all the cores of the machine.
+
+In example 07, the routers are validated one at a time in a for-loop. Validation is CPU-bound
+work and a Python process only uses a single core for it. With hundreds of thousands of
+devices, we want to use the other cores as well.
+
+In this example, I:
+- split the input into chunks
+- validate every chunk in a process pool
+- return the validated models, or their serialized form, and the errors in the order of the input
+- make the chunk size and the number of workers configurable
+- measure how the throughput scales with the number of workers
+
+Sending data to another process means pickling it, and sending models back means pickling them
+again. Pickling IP addresses is expensive, so returning the JSON string ('model_dump_json') is a
+lot cheaper than returning the models when you only need to write the result somewhere else anyway.
+
+The 'if __name__ == "__main__"' is required, as the worker processes import this file.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import ipaddress
+import itertools
+import os
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple, Type, Union
+
+from pydantic import BaseModel, ValidationError, model_validator
+
+
+class Interface(BaseModel):
+    """
+    An interface on a NetworkDevice
+    """
+
+    interface_name: str
+    ipv4: Union[ipaddress.IPv4Interface, None] = None
+    ipv6: Union[ipaddress.IPv6Interface, None] = None
+
+
+class NetworkDevice(BaseModel):
+    """
+    Representation of a NetworkDevice
+    """
+
+    fqdn_name: str
+    hostname: str
+    role: str
+    username: str
+    password: str
+    site: str
+    mgmt_ip: ipaddress.IPv4Interface
+    interfaces: List[Interface] = []
+
+    @model_validator(mode="after")
+    def check_fqdn_name(self):
+        hostname = self.hostname
+        fqdn_name = self.fqdn_name
+        if hostname not in fqdn_name:
+            raise ValueError(f"hostname {hostname} must be included in fqdn_name {fqdn_name}.")
+        return self
+
+    @model_validator(mode="after")
+    def check_ipv4_overlap(self):
+        all_ip_addresses = [self.mgmt_ip] + [i.ipv4 for i in self.interfaces if i.ipv4]
+        for ip1, ip2 in itertools.combinations(all_ip_addresses, 2):
+            if ip1.network.overlaps(ip2.network):
+                raise ValueError(f"Overlapping IPs detected:{ip1.network} and {ip2.network}")
+        return self
+
+
+class Outcome(NamedTuple):
+    """
+    The outcome of validating a single record, either the result or the errors are set.
+    """
+
+    position: int
+    result: Optional[Union[BaseModel, str]]
+    errors: Optional[List[Dict[str, Any]]]
+
+
+def validate_chunk(
+    model: Type[BaseModel], start: int, chunk: Sequence[Dict[str, Any]], serialize: bool
+) -> List[Outcome]:
+    """
+    Validate a chunk of records. This runs in a worker process.
+    """
+    outcomes = []
+    for position, record in enumerate(chunk, start=start):
+        try:
+            instance = model.model_validate(record)
+        except ValidationError as err:
+            # the context can hold the exception a validator raised, which does not always pickle:
+            outcomes.append(Outcome(position, None, err.errors(include_url=False, include_context=False)))
+            continue
+        outcomes.append(Outcome(position, instance.model_dump_json() if serialize else instance, None))
+    return outcomes
+
+
+def validate_parallel(
+    model: Type[BaseModel],
+    records: Sequence[Dict[str, Any]],
+    workers: Optional[int] = None,
+    chunk_size: int = 1000,
+    serialize: bool = False,
+) -> List[Outcome]:
+    """
+    Validate all the records in a process pool and return the outcomes in the order of the records.
+    """
+    starts = range(0, len(records), chunk_size)
+    chunks = (records[start : start + chunk_size] for start in starts)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(
+            validate_chunk,
+            itertools.repeat(model),
+            starts,
+            chunks,
+            itertools.repeat(serialize),
+        )
+        return [outcome for outcomes in results for outcome in outcomes]
+
+
+def make_router(number: int) -> Dict[str, Any]:
+    hostname = f"router-{number}"
+    return {
+        "hostname": hostname,
+        "fqdn_name": f"{hostname}.example.com",
+        "role": "dar",
+        "username": "said",
+        "password": "lovely",
+        "site": "dal09",
+        "mgmt_ip": f"1.{number // 65536 % 256}.{number // 256 % 256}.{number % 256}/32",
+        "interfaces": [{"interface_name": f"et-0/0/{i}", "ipv4": f"10.0.{i}.0/31"} for i in range(8)],
+    }
+
+
+def benchmark(records: Sequence[Dict[str, Any]], chunk_size: int) -> List[Tuple[int, float]]:
+    start = time.perf_counter()
+    for record in records:
+        try:
+            NetworkDevice.model_validate(record)
+        except ValidationError:
+            pass
+    timings = [(0, time.perf_counter() - start)]
+    for workers in range(1, (os.cpu_count() or 1) + 1):
+        start = time.perf_counter()
+        validate_parallel(NetworkDevice, records, workers=workers, chunk_size=chunk_size, serialize=True)
+        timings.append((workers, time.perf_counter() - start))
+    return timings
+
+
+if __name__ == "__main__":
+    routers = [make_router(number) for number in range(20_000)]
+    routers[3]["fqdn_name"] = "router-1.example.com"
+    routers[7]["interfaces"].append({"interface_name": "overlap", "ipv4": "10.0.0.1/32"})
+
+    outcomes = validate_parallel(NetworkDevice, routers, chunk_size=2000)
+    for outcome in outcomes:
+        if outcome.errors:
+            print(f"{routers[outcome.position]['hostname']} instantiation failed: {outcome.errors[0]['msg']}")
+    print(f"{sum(1 for outcome in outcomes if outcome.result)} of {len(routers)} devices are valid\n")
+
+    # 0 workers is the for-loop in the current process. The workers also serialize every device and
+    # pay for moving the data between processes, so a single worker is slower than the for-loop:
+    for workers, seconds in benchmark(routers, chunk_size=2000):
+        print(f"{workers:>3} workers: {len(routers) / seconds:>8.0f} devices/sec")
@@ -0,0 +1,149 @@
+"""
+Computed fields that are only computed once, until one of the fields they depend on changes.
+
+In example 11, 'fqdn_name' is a computed_field. It is computed every time it is accessed and
+every time the model is serialized. For an f-string, that does not matter. For a computed
+field that does real work, like deriving prefixes from all the interfaces, it does.
+
+A 'functools.cached_property' would compute the value once, but it would never notice that the
+hostname changed. In this example, I use a decorator that:
+- caches the value per instance, in a slot that is not part of the model
+- takes the names of the fields the value depends on
+- clears the cached value when one of those fields is assigned to
+
+This also works with 'validate_assignment', as the cache is cleared after the assignment
+passed validation. Mutating a field in place, like appending to a list, is not an assignment
+and does not clear the cache.
+"""
+from functools import wraps
+import ipaddress
+import timeit
+from typing import Any, Callable, ClassVar, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, ConfigDict, computed_field
+
+
+def cached_computed_field(*depends_on: str) -> Callable:
+    """
+    Like '@computed_field' on a '@property', but the value is cached until one of the fields
+    in depends_on is assigned to. Without depends_on, any assignment clears the cached value.
+    """
+
+    def decorator(function: Callable) -> Any:
+        name = function.__name__
+
+        @wraps(function)
+        def getter(self: "CachedComputedModel") -> Any:
+            try:
+                cache = self.__computed_cache__
+            except AttributeError:
+                cache = {}
+                object.__setattr__(self, "__computed_cache__", cache)
+            if name not in cache:
+                cache[name] = function(self)
+            return cache[name]
+
+        getter.depends_on = depends_on
+        return computed_field(property(getter))
+
+    return decorator
+
+
+class CachedComputedModel(BaseModel):
+    """
+    Base class for models with cached computed fields.
+
+    The cache lives in a slot instead of a private attribute. Pydantic does not know about it,
+    so it is not compared by '==', not pickled and not copied by 'model_copy'.
+    """
+
+    __slots__ = ("__computed_cache__",)
+    # field name -> the cached computed fields that depend on it, None -> depend on every field
+    _invalidates: ClassVar[Dict[Optional[str], Tuple[str, ...]]] = {}
+
+    @classmethod
+    def __pydantic_init_subclass__(cls, **kwargs: Any) -> None:
+        super().__pydantic_init_subclass__(**kwargs)
+        invalidates: Dict[Optional[str], List[str]] = {}
+        for name, computed in cls.model_computed_fields.items():
+            depends_on = getattr(computed.wrapped_property.fget, "depends_on", None)
+            if depends_on is None:
+                continue
+            for field_name in depends_on or (None,):
+                if field_name is not None and field_name not in cls.model_fields:
+                    raise TypeError(f"{cls.__name__}.{name} depends on unknown field {field_name}")
+                invalidates.setdefault(field_name, []).append(name)
+        cls._invalidates = {field_name: tuple(names) for field_name, names in invalidates.items()}
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        super().__setattr__(name, value)
+        if name in self.__class__.model_fields:
+            try:
+                cache = self.__computed_cache__
+            except AttributeError:
+                return
+            for computed_name in self._invalidates.get(name, ()) + self._invalidates.get(None, ()):
+                cache.pop(computed_name, None)
+
+
+class Interface(BaseModel):
+    interface_name: str
+    ipv4: ipaddress.IPv4Interface
+
+
+class NetworkDevice(CachedComputedModel):
+    model_config = ConfigDict(validate_assignment=True)
+
+    hostname: str
+    domain: str = "example.com"
+    interfaces: List[Interface] = []
+
+    @cached_computed_field("hostname", "domain")
+    def fqdn_name(self) -> str:
+        return f"{self.hostname}.{self.domain}"
+
+    @cached_computed_field("interfaces")
+    def prefixes(self) -> List[str]:
+        """
+        Every network on the device, collapsed into the smallest set of prefixes.
+        """
+        networks = [interface.ipv4.network for interface in self.interfaces]
+        return [str(network) for network in ipaddress.collapse_addresses(networks)]
+
+
+device = NetworkDevice(
+    hostname="router-1",
+    interfaces=[{"interface_name": f"et-0/0/{i}", "ipv4": f"10.0.{i // 128}.{i % 128 * 2}/31"} for i in range(512)],
+)
+print(device.fqdn_name, device.prefixes)
+device.hostname = "router-2"
+print(device.fqdn_name, device.prefixes)
+"""
+router-1.example.com ['10.0.0.0/22']
+router-2.example.com ['10.0.0.0/22']
+"""
+
+
+class UncachedNetworkDevice(BaseModel):
+    hostname: str
+    domain: str = "example.com"
+    interfaces: List[Interface] = []
+
+    @computed_field
+    @property
+    def fqdn_name(self) -> str:
+        return f"{self.hostname}.{self.domain}"
+
+    @computed_field
+    @property
+    def prefixes(self) -> List[str]:
+        networks = [interface.ipv4.network for interface in self.interfaces]
+        return [str(network) for network in ipaddress.collapse_addresses(networks)]
+
+
+uncached = UncachedNetworkDevice(**device.model_dump(exclude={"fqdn_name", "prefixes"}))
+assert uncached.model_dump_json() == device.model_dump_json()
+number = 200
+for name, instance in [("computed_field", uncached), ("cached_computed_field", device)]:
+    seconds = timeit.timeit(instance.model_dump_json, number=number) / number
+    print(f"{name:<22} {seconds * 1e6:>8.1f}us per model_dump_json")
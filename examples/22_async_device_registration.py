@@ -0,0 +1,211 @@
+"""
+Registering thousands of devices concurrently with asyncio.
+
+In example 11, 'device_handler' registers one device after the other. Every registration
+is a round-trip to the monitoring system and to the inventory, so the total run time is the
+sum of all those round-trips.
+
+In this example, I:
+- make the registration contract of the NetworkDevice async
+- write an async handler that registers many devices at the same time, limited by a semaphore
+- give every attempt a timeout and retry failed attempts with a backoff
+- collect a result for every device, instead of stopping at the first failure
+- run a local stub of the monitoring and inventory systems, so this can be benchmarked offline
+
+The stub speaks a tiny protocol: the client sends a line of JSON and the server answers with a
+line of JSON after a short delay. Every now and then, it fails a request on purpose.
+"""
+from abc import ABC, abstractmethod
+import asyncio
+from enum import Enum
+import ipaddress
+import json
+import random
+import time
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from pydantic import BaseModel, computed_field
+
+
+class Os(Enum):
+    EOS = "eos"
+    JUNOS = "junos"
+    IOSXE = "iosxe"
+
+
+class SystemsClient:
+    """
+    Talks to the monitoring and inventory systems, here the local stub server.
+    """
+
+    def __init__(self, host: str, port: int) -> None:
+        self.host = host
+        self.port = port
+
+    async def request(self, action: str, device: Dict[str, Any]) -> Dict[str, Any]:
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            writer.write(json.dumps({"action": action, "device": device}).encode() + b"\n")
+            await writer.drain()
+            response = json.loads(await reader.readline())
+        finally:
+            writer.close()
+            await writer.wait_closed()
+        if not response["ok"]:
+            raise ConnectionError(response["error"])
+        return response
+
+
+class NetworkDevice(ABC, BaseModel):
+    hostname: str
+    os: Os
+
+    @computed_field
+    @property
+    def fqdn_name(self) -> str:
+        return f"{self.hostname}.example.come"
+
+    @abstractmethod
+    async def register_with_monitoring_system(self, client: SystemsClient) -> None:
+        pass
+
+    async def is_registered_in_all_systems(self, client: SystemsClient) -> bool:
+        response = await client.request("check", self.model_dump(mode="json"))
+        return all(response["systems"].values())
+
+
+class Router(NetworkDevice):
+    loopback: ipaddress.IPv4Interface
+
+    async def register_with_monitoring_system(self, client: SystemsClient) -> None:
+        await client.request("register", self.model_dump(mode="json"))
+
+
+class Switch(NetworkDevice):
+    vlan_interface: ipaddress.IPv4Interface
+    mgmt_vlan: int
+
+    async def register_with_monitoring_system(self, client: SystemsClient) -> None:
+        await client.request("register", self.model_dump(mode="json"))
+
+
+class RegistrationResult(NamedTuple):
+    hostname: str
+    registered: bool
+    attempts: int
+    error: Optional[str]
+
+
+async def register_device(
+    device: NetworkDevice, client: SystemsClient, timeout: float, retries: int, backoff: float
+) -> RegistrationResult:
+    """
+    Register a single device and check the registration. A failed or timed out attempt is retried,
+    and so is an attempt that got a response that is empty or not what we expect.
+    """
+    error = None
+    for attempt in range(1, retries + 2):
+        try:
+            await asyncio.wait_for(device.register_with_monitoring_system(client), timeout)
+            registered = await asyncio.wait_for(device.is_registered_in_all_systems(client), timeout)
+            return RegistrationResult(device.hostname, registered, attempt, None)
+        except (OSError, asyncio.TimeoutError, ValueError, KeyError) as err:
+            error = f"{type(err).__name__}: {err}"
+            if attempt <= retries:
+                await asyncio.sleep(backoff * 2 ** (attempt - 1))
+    return RegistrationResult(device.hostname, False, retries + 1, error)
+
+
+async def device_handler(
+    devices: List[NetworkDevice],
+    client: SystemsClient,
+    concurrency: int = 50,
+    timeout: float = 1.0,
+    retries: int = 2,
+    backoff: float = 0.01,
+) -> List[RegistrationResult]:
+    """
+    Register all the devices, at most 'concurrency' at the same time.
+
+    The results are in the same order as the devices. An unexpected error becomes the result of
+    its device, so it does not throw away the results of the others.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited(device: NetworkDevice) -> RegistrationResult:
+        async with semaphore:
+            return await register_device(device, client, timeout, retries, backoff)
+
+    outcomes = await asyncio.gather(*(limited(device) for device in devices), return_exceptions=True)
+    return [
+        RegistrationResult(device.hostname, False, 0, f"{type(outcome).__name__}: {outcome}")
+        if isinstance(outcome, Exception)
+        else outcome
+        for device, outcome in zip(devices, outcomes)
+    ]
+
+
+class StubSystems:
+    """
+    A local stand-in for the monitoring and inventory systems.
+    """
+
+    def __init__(self, latency: float = 0.005, failure_rate: float = 0.02, seed: int = 1) -> None:
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.registered: Dict[str, Dict[str, Any]] = {}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        request = json.loads(await reader.readline())
+        await asyncio.sleep(self.latency)
+        hostname = request["device"]["hostname"]
+        if self.random.random() < self.failure_rate:
+            response = {"ok": False, "error": f"monitoring system unavailable for {hostname}"}
+        elif request["action"] == "register":
+            self.registered[hostname] = request["device"]
+            response = {"ok": True}
+        else:
+            found = hostname in self.registered
+            response = {"ok": True, "systems": {"monitoring": found, "inventory": found}}
+        writer.write(json.dumps(response).encode() + b"\n")
+        await writer.drain()
+        writer.close()
+
+    async def start(self) -> asyncio.AbstractServer:
+        return await asyncio.start_server(self.handle, "127.0.0.1", 0, backlog=1024)
+
+
+async def sequential_handler(devices: List[NetworkDevice], client: SystemsClient) -> List[RegistrationResult]:
+    """
+    The for-loop from example 11, for comparison.
+    """
+    return [await register_device(device, client, timeout=1.0, retries=2, backoff=0.01) for device in devices]
+
+
+async def main() -> None:
+    devices: List[NetworkDevice] = []
+    for i in range(200):
+        devices.append(Router(hostname=f"router-{i}", os=Os.JUNOS, loopback=f"1.1.{i // 256}.{i % 256}/32"))
+        devices.append(Switch(hostname=f"switch-{i}", os=Os.EOS, vlan_interface=f"2.2.{i // 256}.{i % 256}/32", mgmt_vlan=1))
+
+    stub = StubSystems()
+    server = await stub.start()
+    host, port = server.sockets[0].getsockname()[:2]
+    client = SystemsClient(host, port)
+    async with server:
+        results = await device_handler(devices, client)
+        retried = [result for result in results if result.attempts > 1]
+        print(f"{sum(result.registered for result in results)} of {len(devices)} devices registered")
+        print(f"retried: {retried[:3]}")
+
+        for name, handler in [
+            ("sequential", sequential_handler(devices, client)),
+            ("concurrent", device_handler(devices, client, concurrency=100)),
+        ]:
+            start = time.perf_counter()
+            await handler
+            print(f"{name:<11} {len(devices) / (time.perf_counter() - start):>8.0f} devices/sec")
+
+
+asyncio.run(main())
@@ -0,0 +1,141 @@
+"""
+Writing a large collection of models as NDJSON or as a JSON array, one model at a time.
+
+In example 00, we serialize a single Human with 'model_dump_json'. Exporting a million
+devices that way means building a list of a million strings, or a single huge string, before
+anything is written.
+
+In this example, I write the models to a binary stream as they come in:
+- the serializer of the model writes it straight to bytes, so there is no str in between. This is
+  what 'model_dump_json' uses as well, so the output is the same, with the same defaults.
+  'pydantic_core.to_json' is not: it writes the aliases by default and does not accept
+  'exclude_unset'
+- the bytes go to a buffered writer, which turns many small writes into a few large ones
+- the models can come from a generator, so memory use does not grow with the number of models
+- the keyword arguments of 'model_dump_json', like 'by_alias', 'exclude' and 'exclude_unset', are
+  passed on
+
+'use_enum_values' from example 04 is part of the model config, so it is honored by the model
+itself. In JSON, an Enum is always written as its value.
+"""
+from enum import Enum
+import io
+import json
+import os
+import socket
+import tempfile
+import threading
+import tracemalloc
+from typing import Any, BinaryIO, Iterable
+
+from pydantic import BaseModel, ConfigDict, Field
+
+
+def write_ndjson(models: Iterable[BaseModel], stream: BinaryIO, **dump_kwargs: Any) -> int:
+    """
+    Write every model on its own line and return the number of models that were written.
+    """
+    count = 0
+    for model in models:
+        stream.write(model.__pydantic_serializer__.to_json(model, **dump_kwargs))
+        stream.write(b"\n")
+        count += 1
+    stream.flush()
+    return count
+
+
+def write_json_array(models: Iterable[BaseModel], stream: BinaryIO, **dump_kwargs: Any) -> int:
+    """
+    Write all the models as a single JSON array and return the number of models that were written.
+    """
+    count = 0
+    stream.write(b"[")
+    for model in models:
+        if count:
+            stream.write(b",")
+        stream.write(model.__pydantic_serializer__.to_json(model, **dump_kwargs))
+        count += 1
+    stream.write(b"]")
+    stream.flush()
+    return count
+
+
+class Vendor(str, Enum):
+    CISCO = "cisco"
+    ARISTA = "arista"
+    JUNIPER = "juniper"
+
+
+class Router(BaseModel):
+    model_config = ConfigDict(use_enum_values=True)
+
+    host_name: str = Field(..., serialization_alias="HostName")
+    model: Vendor = Vendor.CISCO
+    password: str
+
+
+def routers(number: int) -> Iterable[Router]:
+    vendors = list(Vendor)
+    for i in range(number):
+        yield Router(host_name=f"router-{i}", model=vendors[i % 3], password="lovely")
+
+
+buffer = io.BytesIO()
+write_ndjson(routers(3), buffer, by_alias=True, exclude={"password"})
+print(buffer.getvalue().decode())
+buffer = io.BytesIO()
+write_json_array(routers(3), buffer, by_alias=True, exclude={"password"})
+print(json.loads(buffer.getvalue()))
+"""
+{"HostName":"router-0","model":"cisco"}
+{"HostName":"router-1","model":"arista"}
+{"HostName":"router-2","model":"juniper"}
+
+[{'HostName': 'router-0', 'model': 'cisco'}, {'HostName': 'router-1', 'model': 'arista'}, {'HostName': 'router-2', 'model': 'juniper'}]
+"""
+
+# every line is what model_dump_json gives, with and without keyword arguments:
+for dump_kwargs in ({}, {"by_alias": True, "exclude": {"password"}}, {"exclude_unset": True}):
+    buffer = io.BytesIO()
+    write_ndjson(routers(3), buffer, **dump_kwargs)
+    assert buffer.getvalue().decode().splitlines() == [router.model_dump_json(**dump_kwargs) for router in routers(3)]
+
+
+# writing to a socket works the same, using 'makefile':
+def receive(server: socket.socket, received: bytearray) -> None:
+    connection, _ = server.accept()
+    with connection:
+        while chunk := connection.recv(65536):
+            received.extend(chunk)
+
+
+with socket.create_server(("127.0.0.1", 0)) as server:
+    received = bytearray()
+    receiver = threading.Thread(target=receive, args=(server, received))
+    receiver.start()
+    with socket.create_connection(server.getsockname()) as client, client.makefile("wb") as stream:
+        write_ndjson(routers(1000), stream)
+    receiver.join()
+    print(f"received {len(received.splitlines())} routers over a socket")
+
+
+# memory, comparing a list of strings to streaming:
+number = 100_000
+with tempfile.TemporaryDirectory() as directory:
+    path = os.path.join(directory, "routers.ndjson")
+
+    tracemalloc.start()
+    lines = [router.model_dump_json() for router in routers(number)]
+    with open(path, "w") as f:
+        f.write("\n".join(lines))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del lines
+    print(f"list of strings: {peak / 1024 / 1024:>6.1f} MiB peak")
+
+    tracemalloc.start()
+    with open(path, "wb", buffering=1024 * 1024) as f:
+        write_ndjson(routers(number), f)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"streaming:       {peak / 1024 / 1024:>6.1f} MiB peak")
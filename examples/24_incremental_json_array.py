@@ -0,0 +1,202 @@
+"""
+Validating the elements of a huge JSON array while it is being read.
+
+When someone posts a 500 MB JSON array of NetworkDevice records, 'json.load' builds all of
+it in memory before we can validate the first record.
+
+In this example, I read the array from a byte stream in chunks and cut it up into its
+elements. We only need to keep track of a few things to know where an element ends:
+- whether we are inside a string, where brackets and commas do not count
+- how deeply nested we are inside the element
+
+An element ends at a ',' or at the closing ']' of the array, when it is not nested and not in
+a string. Every element is handed to 'model_validate_json' as soon as it is complete, so we
+never hold more than a single element (plus one chunk) in memory. A malformed element is
+yielded as an error, together with the byte offset where it starts.
+
+To keep this fast in Python, a regex jumps straight to the next character that matters instead
+of looking at every byte.
+"""
+import io
+import ipaddress
+import json
+import re
+import tracemalloc
+from typing import BinaryIO, Generic, Iterator, List, NamedTuple, Optional, Type, TypeVar, Union
+
+from pydantic import BaseModel, ValidationError
+
+
+ModelType = TypeVar("ModelType", bound=BaseModel)
+
+_STRUCTURE = re.compile(rb'["\[\]{},]')
+_IN_STRING = re.compile(rb'["\\]')
+_WHITESPACE = b" \t\r\n"
+
+
+class Element(NamedTuple, Generic[ModelType]):
+    """
+    The outcome of validating a single element of the array, either model or error is set.
+    """
+
+    offset: int
+    model: Optional[ModelType]
+    error: Optional[Exception]
+
+
+def iter_json_array(
+    stream: BinaryIO, model: Type[ModelType], chunk_size: int = 65536
+) -> Iterator[Element[ModelType]]:
+    """
+    Yield an Element for every item in the JSON array that is read from the stream.
+
+    Raises a ValueError when the stream is not a JSON array, or when it ends before the array does.
+    """
+    buffer = bytearray()
+    base = 0  # the offset in the stream of buffer[0]
+    position = 0  # where to continue scanning in the buffer
+    depth = 0
+    in_string = False
+    started = False
+
+    def read() -> bool:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            return False
+        buffer.extend(chunk)
+        return True
+
+    # find the opening bracket of the array:
+    while not started:
+        stripped = buffer.lstrip(_WHITESPACE)
+        if stripped:
+            if stripped[:1] != b"[":
+                raise ValueError(f"expected a JSON array at byte {base + len(buffer) - len(stripped)}")
+            position = len(buffer) - len(stripped) + 1
+            started = True
+        elif not read():
+            raise ValueError("expected a JSON array, but the stream is empty")
+
+    start = position
+    count = 0
+    while True:
+        pattern = _IN_STRING if in_string else _STRUCTURE
+        match = pattern.search(buffer, position)
+        if match is None:
+            position = len(buffer)
+            if not read():
+                raw = buffer[start:]
+                raise ValueError(
+                    f"unexpected end of the stream at byte {base + len(buffer)}, in the element "
+                    f"that starts at byte {base + start + len(raw) - len(raw.lstrip(_WHITESPACE))}"
+                )
+            continue
+        character = match.group()
+        position = match.end()
+        if in_string:
+            if character == b"\\":
+                if position >= len(buffer) and not read():
+                    raise ValueError(f"unexpected end of the stream at byte {base + len(buffer)}")
+                position += 1  # skip the escaped character
+            else:
+                in_string = False
+        elif character == b'"':
+            in_string = True
+        elif character in b"[{":
+            depth += 1
+        elif depth and character in b"]}":
+            depth -= 1
+        elif depth == 0 and character in b",]":
+            raw = buffer[start : position - 1]
+            element = bytes(raw.strip(_WHITESPACE))
+            offset = base + start + len(raw) - len(raw.lstrip(_WHITESPACE))
+            if element:
+                try:
+                    yield Element(offset, model.model_validate_json(element), None)
+                except ValidationError as err:
+                    yield Element(offset, None, err)
+            elif character == b"," or count:
+                # '[,' or ',,' or ',]', an empty array '[]' is fine:
+                yield Element(offset, None, ValueError(f"empty element at byte {offset}"))
+            count += 1
+            if character == b"]":
+                return
+            # forget everything up to the end of this element:
+            del buffer[:position]
+            base += position
+            position = start = 0
+        elif character in b"]}":
+            raise ValueError(f"unexpected {character.decode()} at byte {base + position - 1}")
+
+
+class Interface(BaseModel):
+    """
+    An interface on a NetworkDevice
+    """
+
+    interface_name: str
+    ipv4: Union[ipaddress.IPv4Interface, None] = None
+
+
+class NetworkDevice(BaseModel):
+    """
+    Representation of a NetworkDevice
+    """
+
+    fqdn_name: str
+    hostname: str
+    role: str
+    username: str
+    password: str
+    site: str
+    mgmt_ip: ipaddress.IPv4Interface
+    interfaces: List[Interface] = []
+
+
+def make_router(number: int) -> dict:
+    hostname = f"router-{number}"
+    return {
+        "hostname": hostname,
+        "fqdn_name": f"{hostname}.example.com",
+        "role": "dar",
+        "username": "said",
+        "password": "a \\ tricky \"password\" with [brackets], {braces} and commas",
+        "site": "dal09",
+        "mgmt_ip": f"1.1.{number // 256 % 256}.{number % 256}/32",
+        "interfaces": [{"interface_name": f"et-0/0/{i}", "ipv4": f"10.0.{i}.0/31"} for i in range(8)],
+    }
+
+
+small = b'[ {"hostname": "r1"}, ' + json.dumps(make_router(1)).encode() + b', {"broken": tru}, {"cut off'
+try:
+    for element in iter_json_array(io.BytesIO(small), NetworkDevice, chunk_size=16):
+        if element.model:
+            print(f"byte {element.offset}: {element.model.hostname}")
+        else:
+            print(f"byte {element.offset}: {element.error.errors()[0]['msg']}")
+except ValueError as err:
+    print(err)
+"""
+byte 2: Field required
+byte 22: router-1
+byte 695: Invalid JSON: expected ident at line 1 column 15
+unexpected end of the stream at byte 721, in the element that starts at byte 712
+"""
+
+
+# memory, comparing json.load to reading the array incrementally:
+document = json.dumps([make_router(number) for number in range(5000)]).encode()
+print(f"document size: {len(document) / 1024 / 1024:.1f} MiB")
+
+tracemalloc.start()
+devices = [NetworkDevice.model_validate(record) for record in json.load(io.BytesIO(document))]
+_, peak = tracemalloc.get_traced_memory()
+tracemalloc.stop()
+print(f"json.load:   {peak / 1024 / 1024:>6.1f} MiB peak, {len(devices)} devices")
+del devices
+
+tracemalloc.start()
+count = sum(1 for element in iter_json_array(io.BytesIO(document), NetworkDevice) if element.model)
+_, peak = tracemalloc.get_traced_memory()
+tracemalloc.stop()
+print(f"incremental: {peak / 1024 / 1024:>6.1f} MiB peak, {count} devices")
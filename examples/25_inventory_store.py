@@ -0,0 +1,343 @@
+"""
+Random access to a large NDJSON inventory, validating only the records we look at.
+
+Looking up a handful of devices in an NDJSON file with hundreds of thousands of records
+should not mean loading and validating all of them.
+
+In this example, I build an 'InventoryStore' that:
+- memory-maps the file, so the operating system decides what is actually read from disk
+- builds an index from a chosen field, like the hostname, to the offset and length of the record
+- stores that index next to the file, so the next process does not have to build it again
+- validates a record into its model only when it is accessed
+- keeps the most recently used models in an LRU cache
+- indexes only the new part of the file when records are appended
+
+When the same key is appended again, the latest record wins. That makes appending a record
+the way to update a device.
+
+The index stores the inode, size and modification time of the file, and a hash of the first and
+last 64 KiB of the part of the file it covers. When the file did not change, a refresh is a single
+'stat'. When it grew, only the window and the new bytes are read. When the file was replaced,
+truncated or its window changed, it was rewritten instead of appended to, and the index is built
+again. A rewrite that keeps the inode, does not shrink the file and leaves both ends of the indexed
+part alone, is not noticed: rewrite the file by writing a new one and renaming it.
+
+Lines that are not JSON or have no key are skipped, and their offsets are kept in 'invalid_lines'.
+The last record does not need a newline. When it is not complete yet, it is picked up on the next
+refresh.
+"""
+from collections import OrderedDict
+import hashlib
+import ipaddress
+import json
+import mmap
+import os
+import tempfile
+import time
+from typing import Dict, Generic, Iterator, List, Optional, Tuple, Type, TypeVar, Union
+
+from pydantic import BaseModel
+from pydantic_core import from_json
+
+
+ModelType = TypeVar("ModelType", bound=BaseModel)
+_WINDOW = 64 * 1024
+
+
+class InventoryStore(Generic[ModelType]):
+    """
+    An NDJSON file of records, indexed on key_field.
+
+    Use it as a context manager, or call close when you are done with it.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        model: Type[ModelType],
+        key_field: str,
+        index_path: Optional[str] = None,
+        cache_size: int = 1024,
+    ) -> None:
+        self.path = path
+        self.model = model
+        self.key_field = key_field
+        self.index_path = index_path or f"{path}.{key_field}.index"
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, ModelType]" = OrderedDict()
+        self._index: Dict[str, Tuple[int, int]] = {}
+        self._indexed_size = 0
+        self._check = ""
+        # (st_ino, st_size, st_mtime_ns) of the file when it was indexed:
+        self._stat: Optional[Tuple[int, int, int]] = None
+        # the offset of the last record when it had no newline, it is indexed again when it grows:
+        self._open_line: Optional[int] = None
+        self.invalid_lines: List[int] = []
+        self._file = open(path, "rb")
+        self._map: Optional[mmap.mmap] = None
+        self._load_index()
+        self.refresh()
+
+    def __enter__(self) -> "InventoryStore[ModelType]":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._close_map()
+        self._file.close()
+
+    def _close_map(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._index
+
+    def keys(self) -> Iterator[str]:
+        return iter(self._index)
+
+    def __getitem__(self, key: str) -> ModelType:
+        """
+        Return the model for the key, validating the record when it is not in the cache.
+        """
+        instance = self._cache.get(key)
+        if instance is not None:
+            self._cache.move_to_end(key)
+            return instance
+        offset, length = self._index[key]
+        if os.fstat(self._file.fileno()).st_size < len(self._map):
+            # reading past the end of a truncated file raises SIGBUS:
+            self.refresh()
+            offset, length = self._index[key]
+        record = self._map[offset : offset + length]
+        if self._key_of(record) != key:
+            # the file changed since the last refresh:
+            self.refresh()
+            offset, length = self._index[key]
+            record = self._map[offset : offset + length]
+        instance = self.model.model_validate_json(record)
+        self._cache[key] = instance
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return instance
+
+    def get(self, key: str, default: Optional[ModelType] = None) -> Optional[ModelType]:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def refresh(self) -> None:
+        """
+        Index the records that were appended to the file since the last time we looked.
+
+        When the file changed in any other way, the index is rebuilt from scratch.
+        """
+        if os.stat(self.path).st_ino != os.fstat(self._file.fileno()).st_ino:
+            # the file was replaced, by a rename for instance, so we open the new one:
+            self._close_map()
+            self._file.close()
+            self._file = open(self.path, "rb")
+        stat = os.fstat(self._file.fileno())
+        # the size is checked before the map is touched, a map that is longer than the file raises SIGBUS:
+        if self._map is not None and len(self._map) != stat.st_size:
+            self._close_map()
+        if self._map is None and stat.st_size:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if (stat.st_ino, stat.st_size, stat.st_mtime_ns) == self._stat:
+            return
+        if self._stat is not None and stat.st_ino != self._stat[0] or stat.st_size < self._indexed_size:
+            self._reset()
+        if stat.st_size:
+            if self._indexed_size and self._window_check(self._indexed_size) != self._check:
+                self._reset()
+            start = self._indexed_size if self._open_line is None else self._open_line
+            if len(self._map) > self._indexed_size:
+                self._index_from(start)
+        self._stat = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        self._save_index()
+
+    def _reset(self) -> None:
+        self._index, self._indexed_size, self._check, self.invalid_lines = {}, 0, "", []
+        self._open_line = None
+        self._cache.clear()
+
+    def _window_check(self, size: int) -> str:
+        """
+        Hash the first and the last _WINDOW bytes before size, so the cost does not grow with the file.
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        with memoryview(self._map) as view:
+            digest.update(view[: min(size, _WINDOW)])
+            digest.update(view[max(size - _WINDOW, 0) : size])
+        return digest.hexdigest()
+
+    def _key_of(self, record: bytes) -> Optional[str]:
+        try:
+            return str(from_json(record)[self.key_field])
+        except (ValueError, KeyError, TypeError):
+            return None
+
+    def _index_from(self, start: int) -> None:
+        """
+        Add every line from start onwards to the index, and forget the cached models of keys that
+        got a new record.
+
+        A last line without a newline is indexed when it is a complete record. A complete JSON
+        object can only be followed by whitespace, so when it grows its key stays the same.
+        """
+        offset = start
+        end = len(self._map)
+        self._open_line = None
+        while offset < end:
+            newline = self._map.find(b"\n", offset, end)
+            stop = end if newline == -1 else newline
+            if stop > offset:
+                key = self._key_of(self._map[offset:stop])
+                if key is None and newline == -1:
+                    break  # a record that is still being written, we pick it up on the next refresh
+                if key is None:
+                    self.invalid_lines.append(offset)
+                else:
+                    self._index[key] = (offset, stop - offset)
+                    self._cache.pop(key, None)
+                    if newline == -1:
+                        self._open_line = offset
+            offset = stop + 1
+        self._indexed_size = min(offset, end)
+        self._check = self._window_check(self._indexed_size)
+
+    def _load_index(self) -> None:
+        try:
+            with open(self.index_path) as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return
+        if stored.get("key_field") != self.key_field or "stat" not in stored:
+            return
+        self._index = {key: tuple(entry) for key, entry in stored["entries"].items()}
+        self._indexed_size = stored["size"]
+        self._check = stored["check"]
+        self._stat = tuple(stored["stat"])
+        self._open_line = stored["open"]
+        self.invalid_lines = stored.get("invalid", [])
+
+    def _save_index(self) -> None:
+        temporary = f"{self.index_path}.tmp"
+        with open(temporary, "w") as f:
+            json.dump(
+                {
+                    "key_field": self.key_field,
+                    "size": self._indexed_size,
+                    "check": self._check,
+                    "stat": self._stat,
+                    "open": self._open_line,
+                    "invalid": self.invalid_lines,
+                    "entries": self._index,
+                },
+                f,
+            )
+        os.replace(temporary, self.index_path)
+
+
+class Interface(BaseModel):
+    """
+    An interface on a NetworkDevice
+    """
+
+    interface_name: str
+    ipv4: Union[ipaddress.IPv4Interface, None] = None
+
+
+class NetworkDevice(BaseModel):
+    """
+    Representation of a NetworkDevice
+    """
+
+    fqdn_name: str
+    hostname: str
+    role: str
+    username: str
+    password: str
+    site: str
+    mgmt_ip: ipaddress.IPv4Interface
+    interfaces: List[Interface] = []
+
+
+def make_router(number: int, role: str = "dar") -> dict:
+    hostname = f"router-{number}"
+    return {
+        "hostname": hostname,
+        "fqdn_name": f"{hostname}.example.com",
+        "role": role,
+        "username": "said",
+        "password": "lovely",
+        "site": "dal09",
+        "mgmt_ip": f"1.{number // 65536 % 256}.{number // 256 % 256}.{number % 256}/32",
+        "interfaces": [{"interface_name": f"et-0/0/{i}", "ipv4": f"10.0.{i}.0/31"} for i in range(8)],
+    }
+
+
+with tempfile.TemporaryDirectory() as directory:
+    path = os.path.join(directory, "inventory.ndjson")
+    with open(path, "w") as f:
+        for number in range(20_000):
+            f.write(json.dumps(make_router(number)) + "\n")
+
+    start = time.perf_counter()
+    with open(path) as f:
+        everything = {device.hostname: device for device in map(NetworkDevice.model_validate_json, f)}
+    print(f"validating everything: {time.perf_counter() - start:.3f}s")
+    del everything
+
+    start = time.perf_counter()
+    with InventoryStore(path, NetworkDevice, "hostname") as store:
+        print(f"building the index:    {time.perf_counter() - start:.3f}s, {len(store)} devices")
+
+    start = time.perf_counter()
+    with InventoryStore(path, NetworkDevice, "hostname") as store:
+        print(f"loading the index:     {time.perf_counter() - start:.3f}s")
+        start = time.perf_counter()
+        devices = [store["router-42"], store["router-13337"], store["router-42"]]
+        print(f"three lookups:         {time.perf_counter() - start:.6f}s {[d.hostname for d in devices]}")
+
+        # append a new device and a new version of an existing one:
+        with open(path, "a") as f:
+            f.write(json.dumps(make_router(20_000)) + "\n")
+            f.write(json.dumps(make_router(42, role="core")) + "\n")
+        start = time.perf_counter()
+        store.refresh()
+        print(f"indexing the appended: {time.perf_counter() - start:.3f}s, {len(store)} devices")
+        print(store["router-42"].role, store["router-20000"].hostname)
+
+    # rewrite the file with other records, and a line that is not JSON:
+    with open(path, "w") as f:
+        f.write(json.dumps(make_router(3)) + "\n" + "not json\n" + json.dumps(make_router(1)) + "\n")
+    with InventoryStore(path, NetworkDevice, "hostname") as store:
+        print(list(store.keys()), store["router-1"].hostname, store.invalid_lines)
+
+        # a last record without a newline, and one that is still being written:
+        with open(path, "a") as f:
+            f.write(json.dumps(make_router(5)))
+        store.refresh()
+        with open(path, "a") as f:
+            f.write("\n" + json.dumps(make_router(6))[:40])
+        store.refresh()
+        print(list(store.keys()), store["router-5"].hostname)
+
+        # truncating the file while it is mapped:
+        with open(path, "r+") as f:
+            f.truncate(10)
+        print(store.get("router-3"), len(store), store.invalid_lines)
+"""
+core router-20000
+['router-3', 'router-1'] router-1 [617]
+['router-3', 'router-1', 'router-5'] router-5
+None 0 []
+"""
@@ -0,0 +1,266 @@
+"""
+Skipping the validation of payloads we have seen before.
+
+When we poll devices, most payloads are byte for byte the same as during the previous cycle.
+Every one of them still goes through the full validation, including the model validators
+from example 07.
+
+In this example, I put a cache in front of the validation:
+- the key is a hash of the payload, together with the model and a fingerprint of its schema and
+  of the source files of the model and its validators, like in example 31
+- a hit returns the instance that was validated before
+- the cache is bounded, evicting the least recently used entry, and entries expire after a TTL
+- the cache can be saved to disk and loaded again in the next run
+- hits, misses, evictions and expirations are counted
+
+Handing out the same instance more than once is only safe when nobody can change it, so the
+cache only accepts models with 'frozen=True', and so must be the models nested in them. Note that frozen does not stop you from appending
+to a list inside the model, so don't do that.
+"""
+from collections import OrderedDict
+import hashlib
+import ipaddress
+import itertools
+import json
+import os
+import pickle
+import tempfile
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Type, TypeVar, Union
+import uuid
+
+import pydantic
+from pydantic import BaseModel, ConfigDict, model_validator
+from pydantic_core import to_json
+
+from _model_sources import nested_models, source_files
+
+
+ModelType = TypeVar("ModelType", bound=BaseModel)
+
+
+def _tagged(value: Any) -> Any:
+    """
+    'to_json' writes a tuple like a list and an Enum member as its value, while strict mode and
+    unions tell them apart. So every value, and every item in a container, is written together
+    with its type.
+    """
+    kind = type(value)
+    if isinstance(value, dict):
+        value = [[_tagged(key), _tagged(item)] for key, item in value.items()]
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        value = [_tagged(item) for item in value]
+    return [f"{kind.__module__}.{kind.__qualname__}", value]
+
+
+class CacheStats(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    expirations: int
+    currsize: int
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class ValidationCache:
+    """
+    Cache validated instances on a hash of their input.
+    """
+
+    def __init__(self, maxsize: int = 100_000, ttl: Optional[float] = None) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # key -> (time the entry was stored, instance)
+        self._entries: "OrderedDict[Tuple[str, bytes], Tuple[float, BaseModel]]" = OrderedDict()
+        self._fingerprints: Dict[Type[BaseModel], str] = {}
+        self._hits = self._misses = self._evictions = self._expirations = 0
+
+    def _fingerprint(self, model: Type[BaseModel]) -> str:
+        """
+        Identify the model by its name, its schema and its source, so a cache saved to disk is not
+        used after the model or one of its validators changed. When the source is not in a file, the
+        fingerprint is unique to this process.
+        """
+        fingerprint = self._fingerprints.get(model)
+        if fingerprint is None:
+            not_frozen = [nested.__name__ for nested in nested_models(model) if not nested.model_config.get("frozen")]
+            if not_frozen:
+                raise TypeError(
+                    f"{model.__name__} and its nested models must be frozen to share its instances through a cache, "
+                    f"{', '.join(not_frozen)} is not"
+                )
+            digest = hashlib.blake2b(digest_size=8)
+            digest.update(pydantic.VERSION.encode())
+            digest.update(json.dumps(model.model_json_schema(), sort_keys=True).encode())
+            files = source_files(model)
+            if files is None:
+                digest.update(uuid.uuid4().bytes)
+            else:
+                for path in sorted(files):
+                    with open(path, "rb") as f:
+                        digest.update(f.read())
+            fingerprint = f"{model.__module__}.{model.__qualname__}:{digest.hexdigest()}"
+            self._fingerprints[model] = fingerprint
+        return fingerprint
+
+    def _lookup(self, key: Tuple[str, bytes]) -> Optional[BaseModel]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self._misses += 1
+            return None
+        stored, instance = entry
+        if self.ttl is not None and time.time() - stored > self.ttl:
+            del self._entries[key]
+            self._expirations += 1
+            self._misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self._hits += 1
+        return instance
+
+    def _store(self, key: Tuple[str, bytes], instance: BaseModel) -> None:
+        self._entries[key] = (time.time(), instance)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def validate_json(self, model: Type[ModelType], payload: Union[str, bytes]) -> ModelType:
+        """
+        Like 'model.model_validate_json(payload)', but a payload we saw before is not validated again.
+        """
+        if isinstance(payload, str):
+            payload = payload.encode()
+        key = (self._fingerprint(model), hashlib.blake2b(payload, digest_size=16).digest())
+        instance = self._lookup(key)
+        if instance is None:
+            instance = model.model_validate_json(payload)
+            self._store(key, instance)
+        return instance
+
+    def validate_python(self, model: Type[ModelType], data: Any) -> ModelType:
+        """
+        Like 'model.model_validate(data)'. The data is serialized to JSON, with the type of every
+        value, to compute the hash. So (1, 2) and [1, 2] are different payloads, and so are two dicts
+        with the same items in a different order.
+        """
+        key = (self._fingerprint(model), hashlib.blake2b(to_json(_tagged(data)), digest_size=16).digest())
+        instance = self._lookup(key)
+        if instance is None:
+            instance = model.model_validate(data)
+            self._store(key, instance)
+        return instance
+
+    def stats(self) -> CacheStats:
+        return CacheStats(self._hits, self._misses, self._evictions, self._expirations, len(self._entries))
+
+    def save(self, path: str) -> None:
+        """
+        Write the entries to disk. The models are pickled, so they must be importable when loading.
+        """
+        temporary = f"{path}.tmp"
+        with open(temporary, "wb") as f:
+            pickle.dump(self._entries, f)
+        os.replace(temporary, path)
+
+    def load(self, path: str) -> None:
+        """
+        Read the entries that were saved to disk, expired entries are dropped.
+        """
+        try:
+            with open(path, "rb") as f:
+                entries = pickle.load(f)
+        except FileNotFoundError:
+            return
+        now = time.time()
+        for key, (stored, instance) in entries.items():
+            if self.ttl is None or now - stored <= self.ttl:
+                self._entries[key] = (stored, instance)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+
+class Interface(BaseModel):
+    """
+    An interface on a NetworkDevice
+    """
+
+    model_config = ConfigDict(frozen=True)
+
+    interface_name: str
+    ipv4: Union[ipaddress.IPv4Interface, None] = None
+
+
+class NetworkDevice(BaseModel):
+    """
+    Representation of a NetworkDevice
+    """
+
+    model_config = ConfigDict(frozen=True)
+
+    fqdn_name: str
+    hostname: str
+    role: str
+    username: str
+    password: str
+    site: str
+    mgmt_ip: ipaddress.IPv4Interface
+    interfaces: List[Interface] = []
+
+    @model_validator(mode="after")
+    def check_ipv4_overlap(self):
+        all_ip_addresses = [self.mgmt_ip] + [i.ipv4 for i in self.interfaces if i.ipv4]
+        for ip1, ip2 in itertools.combinations(all_ip_addresses, 2):
+            if ip1.network.overlaps(ip2.network):
+                raise ValueError(f"Overlapping IPs detected:{ip1.network} and {ip2.network}")
+        return self
+
+
+def poll(number: int, cycle: int) -> bytes:
+    """
+    The payload of a device during a polling cycle, about 5% of the devices change every cycle.
+    """
+    hostname = f"router-{number}"
+    changed = cycle if number % 20 == cycle % 20 else 0
+    return json.dumps(
+        {
+            "hostname": hostname,
+            "fqdn_name": f"{hostname}.example.com",
+            "role": "dar",
+            "username": "said",
+            "password": f"lovely-{changed}",
+            "site": "dal09",
+            "mgmt_ip": f"1.1.{number // 256 % 256}.{number % 256}/32",
+            "interfaces": [{"interface_name": f"et-0/0/{i}", "ipv4": f"10.0.{i}.0/31"} for i in range(24)],
+        }
+    ).encode()
+
+
+devices, cycles = 1000, 5
+payloads = [[poll(number, cycle) for number in range(devices)] for cycle in range(cycles)]
+
+start = time.perf_counter()
+for cycle in payloads:
+    for payload in cycle:
+        NetworkDevice.model_validate_json(payload)
+print(f"without cache: {time.perf_counter() - start:.3f}s")
+
+cache = ValidationCache(maxsize=10_000, ttl=3600)
+start = time.perf_counter()
+for cycle in payloads:
+    for payload in cycle:
+        cache.validate_json(NetworkDevice, payload)
+stats = cache.stats()
+print(f"with cache:    {time.perf_counter() - start:.3f}s, {stats}, hit rate {stats.hit_rate:.0%}")
+
+with tempfile.TemporaryDirectory() as directory:
+    path = os.path.join(directory, "validation.cache")
+    cache.save(path)
+    next_run = ValidationCache(maxsize=10_000, ttl=3600)
+    next_run.load(path)
+    for payload in payloads[-1]:
+        next_run.validate_json(NetworkDevice, payload)
+    print(f"next run, loaded from disk: hit rate {next_run.stats().hit_rate:.0%}")
@@ -0,0 +1,412 @@
+"""
+Storing a large collection of models column by column.
+
+Every NetworkDevice instance is a full Python object with its own '__dict__', and every
+'role', 'site' and 'username' is a string that is repeated half a million times.
+
+In this example, I store a collection of models as columns instead, in a 'ModelTable':
+- strings are dictionary encoded: every distinct value is stored once and rows hold an integer code
+- Enums are stored as the integer code of their member
+- IP addresses are stored as integers, together with the prefix length
+- ints, floats and bools go into typed arrays
+- a list of nested models becomes a child table plus the offsets where every row starts
+- anything else is kept as a Python object
+
+Filtering, like role == "dar" and site == "dal09", compares integer codes with NumPy. A model
+instance is only created when a row is accessed, using 'model_construct' as the data was
+validated when the table was built.
+
+This example requires NumPy:
+pip install numpy
+"""
+from abc import ABC, abstractmethod
+from array import array
+from enum import Enum
+import ipaddress
+import tracemalloc
+from typing import Any, Callable, Dict, Generic, Iterable, Iterator, List, Type, TypeVar, Union, get_args, get_origin
+
+import numpy as np
+from pydantic import BaseModel
+
+
+ModelType = TypeVar("ModelType", bound=BaseModel)
+
+_NO_PREFIX = 255  # the prefix length we store for a missing IP address
+
+
+class Column(ABC):
+    """
+    A column that is built by appending values, and is read-only once it is finished.
+    """
+
+    @abstractmethod
+    def append(self, value: Any) -> None:
+        pass
+
+    def finish(self) -> None:
+        pass
+
+    @abstractmethod
+    def get(self, row: int) -> Any:
+        pass
+
+    def equals(self, value: Any) -> np.ndarray:
+        """
+        A boolean mask of the rows where the column equals the value.
+        """
+        raise TypeError(f"{type(self).__name__} does not support filtering")
+
+
+class DictionaryColumn(Column):
+    """
+    Every distinct value is stored once, rows store the code of the value. None has code -1.
+    """
+
+    def __init__(self, normalize: Callable[[Any], Any] = lambda value: value) -> None:
+        self.normalize = normalize
+        self.values: List[Any] = []
+        self.codes_by_value: Dict[Any, int] = {}
+        self._codes = array("i")
+        self.codes: np.ndarray
+
+    def append(self, value: Any) -> None:
+        if value is None:
+            self._codes.append(-1)
+            return
+        code = self.codes_by_value.get(value)
+        if code is None:
+            code = self.codes_by_value[value] = len(self.values)
+            self.values.append(value)
+        self._codes.append(code)
+
+    def finish(self) -> None:
+        # the smallest integer type that fits all the codes:
+        dtype = np.int8 if len(self.values) < 2**7 else np.int16 if len(self.values) < 2**15 else np.int32
+        self.codes = np.frombuffer(self._codes, dtype=np.int32).astype(dtype)
+        del self._codes
+
+    def get(self, row: int) -> Any:
+        code = self.codes[row]
+        return None if code == -1 else self.values[code]
+
+    def equals(self, value: Any) -> np.ndarray:
+        if value is None:
+            return self.codes == -1
+        try:
+            code = self.codes_by_value.get(self.normalize(value))
+        except ValueError:  # like Os("bogus"), a value that can not be in the column
+            code = None
+        if code is None:
+            return np.zeros(len(self.codes), dtype=bool)
+        return self.codes == code
+
+
+class EnumColumn(DictionaryColumn):
+    def __init__(self, enum: Type[Enum]) -> None:
+        super().__init__(normalize=enum)
+        for member in enum:
+            self.append(member)
+        self._codes = array("i")  # the members are registered, but they are not rows
+
+
+class IPColumn(Column):
+    """
+    IPv4 addresses, interfaces and networks as a 32 bit integer, IPv6 as two 64 bit integers.
+    """
+
+    def __init__(self, ip_type: type) -> None:
+        self.ip_type = ip_type
+        self.version = 4 if ip_type.__name__.startswith("IPv4") else 6
+        self.is_address = ip_type in (ipaddress.IPv4Address, ipaddress.IPv6Address)
+        self._high = array("Q")
+        self._low = array("Q") if self.version == 6 else array("I")
+        self._prefixlen = array("B")
+
+    def _split(self, value: Any):
+        value = self.ip_type(value)
+        if self.is_address:
+            address, prefixlen = int(value), value.max_prefixlen
+        elif hasattr(value, "network"):  # an interface keeps the host bits of its address
+            address, prefixlen = int(value), value.network.prefixlen
+        else:
+            address, prefixlen = int(value.network_address), value.prefixlen
+        return address >> 64, address & (2**64 - 1), prefixlen
+
+    def append(self, value: Any) -> None:
+        high, low, prefixlen = (0, 0, _NO_PREFIX) if value is None else self._split(value)
+        if self.version == 6:
+            self._high.append(high)
+        self._low.append(low)
+        self._prefixlen.append(prefixlen)
+
+    def finish(self) -> None:
+        self.high = np.frombuffer(self._high, dtype=np.uint64) if self.version == 6 else None
+        self.low = np.frombuffer(self._low, dtype=np.uint64 if self.version == 6 else np.uint32)
+        self.prefixlen = np.frombuffer(self._prefixlen, dtype=np.uint8)
+
+    def get(self, row: int) -> Any:
+        prefixlen = int(self.prefixlen[row])
+        if prefixlen == _NO_PREFIX:
+            return None
+        address = int(self.low[row]) if self.high is None else int(self.high[row]) << 64 | int(self.low[row])
+        if self.is_address:
+            return self.ip_type(address)
+        return self.ip_type((address, prefixlen))
+
+    def equals(self, value: Any) -> np.ndarray:
+        if value is None:
+            return self.prefixlen == _NO_PREFIX
+        high, low, prefixlen = self._split(value)
+        mask = (self.low == low) & (self.prefixlen == prefixlen)
+        if self.high is not None:
+            mask &= self.high == high
+        return mask
+
+
+class NumberColumn(Column):
+    def __init__(self, number_type: type) -> None:
+        self.number_type = number_type
+        self._values = array({bool: "b", int: "q", float: "d"}[number_type])
+
+    def append(self, value: Any) -> None:
+        self._values.append(value)
+
+    def finish(self) -> None:
+        self.values = np.frombuffer(self._values, dtype={bool: np.int8, int: np.int64, float: np.float64}[self.number_type])
+
+    def get(self, row: int) -> Any:
+        return self.number_type(self.values[row])
+
+    def equals(self, value: Any) -> np.ndarray:
+        return self.values == value
+
+
+class ListOfModelsColumn(Column):
+    """
+    All the nested models of all the rows go into one child table, rows store where they start.
+    """
+
+    def __init__(self, model: Type[BaseModel]) -> None:
+        self.child = ModelTable[model]._unfinished()
+        self._offsets = array("Q", [0])
+
+    def append(self, value: Any) -> None:
+        for item in value:
+            self.child._append(item)
+        self._offsets.append(self.child._rows_appended)
+
+    def finish(self) -> None:
+        self.child._finish()
+        self.offsets = np.frombuffer(self._offsets, dtype=np.uint64)
+
+    def get(self, row: int) -> Any:
+        return [self.child[i] for i in range(int(self.offsets[row]), int(self.offsets[row + 1]))]
+
+
+class ObjectColumn(Column):
+    def __init__(self) -> None:
+        self.values: List[Any] = []
+
+    def append(self, value: Any) -> None:
+        self.values.append(value)
+
+    def get(self, row: int) -> Any:
+        return self.values[row]
+
+
+_IP_TYPES = (
+    ipaddress.IPv4Address,
+    ipaddress.IPv4Interface,
+    ipaddress.IPv4Network,
+    ipaddress.IPv6Address,
+    ipaddress.IPv6Interface,
+    ipaddress.IPv6Network,
+)
+
+
+def column_for(annotation: Any) -> Column:
+    """
+    Pick the column that stores values of the annotated type most compactly.
+    """
+    optional = False
+    if get_origin(annotation) is Union:
+        members = [arg for arg in get_args(annotation) if arg is not type(None)]
+        optional = len(members) < len(get_args(annotation))
+        if len(members) != 1:
+            return ObjectColumn()
+        annotation = members[0]
+    if annotation is str:
+        return DictionaryColumn()
+    if isinstance(annotation, type) and issubclass(annotation, Enum):
+        return EnumColumn(annotation)
+    if annotation in _IP_TYPES:
+        return IPColumn(annotation)
+    if annotation in (bool, int, float) and not optional:
+        return NumberColumn(annotation)
+    if get_origin(annotation) in (list, List) and not optional:
+        (item,) = get_args(annotation) or (Any,)
+        if isinstance(item, type) and issubclass(item, BaseModel):
+            return ListOfModelsColumn(item)
+    return ObjectColumn()
+
+
+class ModelTable(Generic[ModelType]):
+    """
+    A read-only, columnar collection of models. Use it as ModelTable[NetworkDevice](devices).
+    """
+
+    model: Type[ModelType]
+    _tables: Dict[type, type] = {}
+
+    def __class_getitem__(cls, model: Type[ModelType]) -> type:
+        table = cls._tables.get(model)
+        if table is None:
+            table = cls._tables[model] = type(f"ModelTable[{model.__name__}]", (cls,), {"model": model})
+        return table
+
+    def __init__(self, models: Iterable[ModelType]) -> None:
+        self._start()
+        for instance in models:
+            self._append(instance)
+        self._finish()
+
+    @classmethod
+    def _unfinished(cls) -> "ModelTable[ModelType]":
+        """
+        A table that is still being built, used for the child tables of nested models.
+        """
+        table = cls.__new__(cls)
+        table._start()
+        return table
+
+    def _start(self) -> None:
+        if not hasattr(self, "model"):
+            raise TypeError("use ModelTable[SomeModel](models) to say which model is stored")
+        self.columns: Dict[str, Column] = {
+            name: column_for(field.annotation) for name, field in self.model.model_fields.items()
+        }
+        self._rows_appended = 0
+
+    def _append(self, instance: ModelType) -> None:
+        for name, column in self.columns.items():
+            column.append(getattr(instance, name))
+        self._rows_appended += 1
+
+    def _finish(self) -> None:
+        for column in self.columns.values():
+            column.finish()
+        self._length = self._rows_appended
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, row: int) -> ModelType:
+        if not -self._length <= row < self._length:
+            raise IndexError(f"row {row} is out of range")
+        row %= self._length
+        return self.model.model_construct(**{name: column.get(row) for name, column in self.columns.items()})
+
+    def __iter__(self) -> Iterator[ModelType]:
+        return (self[row] for row in range(self._length))
+
+    def where(self, **conditions: Any) -> np.ndarray:
+        """
+        A boolean mask of the rows where all the fields equal the given values.
+        """
+        mask = np.ones(self._length, dtype=bool)
+        for name, value in conditions.items():
+            mask &= self.columns[name].equals(value)
+        return mask
+
+    def select(self, mask: np.ndarray) -> Iterator[ModelType]:
+        """
+        Create the models for the rows in the mask.
+        """
+        return (self[int(row)] for row in np.flatnonzero(mask))
+
+
+class Os(Enum):
+    EOS = "eos"
+    JUNOS = "junos"
+    IOSXE = "iosxe"
+
+
+class Interface(BaseModel):
+    """
+    An interface on a NetworkDevice
+    """
+
+    interface_name: str
+    ipv4: Union[ipaddress.IPv4Interface, None] = None
+    ipv6: Union[ipaddress.IPv6Interface, None] = None
+
+
+class NetworkDevice(BaseModel):
+    """
+    Representation of a NetworkDevice
+    """
+
+    fqdn_name: str
+    hostname: str
+    role: str
+    username: str
+    password: str
+    site: str
+    os: Os
+    mgmt_ip: ipaddress.IPv4Interface
+    interfaces: List[Interface] = []
+
+
+def make_devices(number: int) -> Iterator[NetworkDevice]:
+    roles, sites, systems = ["dar", "bbr", "csr"], ["dal09", "ams01", "fra02", "sjc04"], list(Os)
+    for i in range(number):
+        hostname = f"router-{i}"
+        yield NetworkDevice(
+            hostname=hostname,
+            fqdn_name=f"{hostname}.example.com",
+            role=roles[i % 3],
+            username="said",
+            password="lovely",
+            site=sites[i % 4],
+            os=systems[i % 3],
+            mgmt_ip=f"1.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}/32",
+            interfaces=[
+                {"interface_name": "et-0/0/0", "ipv4": f"10.0.{i % 256}.0/31"},
+                {"interface_name": "et-0/0/1", "ipv6": f"2001:db8::{i % 65536:x}/127"},
+            ],
+        )
+
+
+table = ModelTable[NetworkDevice](make_devices(12))
+mask = table.where(role="dar", site="dal09")
+for device in table.select(mask):
+    print(device.hostname, device.os, device.mgmt_ip, device.interfaces[1].ipv6)
+assert list(table) == list(make_devices(12))
+"""
+router-0 Os.EOS 1.0.0.0/32 2001:db8::/127
+"""
+
+
+number = 20_000
+tracemalloc.start()
+devices = list(make_devices(number))
+current, _ = tracemalloc.get_traced_memory()
+tracemalloc.stop()
+print(f"list of {number} models:   {current / 1024 / 1024:>6.1f} MiB")
+# without the list, the table can not share the strings of the models:
+del devices
+
+tracemalloc.start()
+table = ModelTable[NetworkDevice](make_devices(number))
+current, _ = tracemalloc.get_traced_memory()
+tracemalloc.stop()
+print(f"table of {number} models:  {current / 1024 / 1024:>6.1f} MiB")
+print(f"{int(table.where(role='dar', site='dal09').sum())} devices with role dar in dal09")
+print(f"{int(table.where(os='bogus').sum())} devices with os bogus")
+"""
+list of 20000 models:     70.2 MiB
+table of 20000 models:     6.1 MiB
+1667 devices with role dar in dal09
+0 devices with os bogus
+"""
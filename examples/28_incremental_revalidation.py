@@ -0,0 +1,278 @@
+"""
+Only rerunning the validators that read the field that was assigned to.
+
+With 'validate_assignment', assigning to a single field of a NetworkDevice reruns every
+'model_validator(mode="after")', including the quadratic 'check_ipv4_overlap' from example 07.
+Even when all we changed was the password.
+
+In this example, validators say which fields they read:
+- '@incremental_validator("hostname", "fqdn_name")' declares the fields explicitly
+- '@incremental_validator()' lets the model find out: while the validator runs during a full
+  validation, every field it reads is recorded
+
+When the model is created, all the validators run. When a field is assigned to, Pydantic still
+validates the new value of the field, but only the validators that read that field run again.
+A validator that was never seen reading anything runs on every assignment, to be safe. When a
+validator rejects the new value, the old value is put back.
+
+The recorded fields are the ones the validator read on the paths that actually ran. A validator
+that reads a field only in a rare branch, should declare its fields explicitly.
+"""
+from contextvars import ContextVar
+import ipaddress
+import itertools
+import timeit
+import types
+from typing import Any, Callable, ClassVar, Dict, List, Optional, Set, Tuple, Union
+
+from pydantic import BaseModel, ConfigDict, ValidationError, model_validator
+
+
+# the (instance, field) that is being assigned to, None during a full validation. The instance is
+# kept, so nested models that are validated during the assignment still run all their validators:
+_assigning: ContextVar[Optional[Tuple[BaseModel, str]]] = ContextVar("assigning", default=None)
+_MISSING = object()
+
+
+def incremental_validator(*reads: str) -> Callable:
+    """
+    Mark a method as a validator that runs after the model is validated.
+
+    Without reads, the fields the validator reads are recorded while it runs.
+    """
+
+    def decorator(function: Callable) -> Callable:
+        function.__incremental_reads__ = frozenset(reads) if reads else None
+        return function
+
+    return decorator
+
+
+class _Recorder:
+    """
+    Stands in for the model while a validator runs, and writes down every field that is read.
+    """
+
+    def __init__(self, instance: BaseModel, read: Set[str]) -> None:
+        object.__setattr__(self, "_instance", instance)
+        object.__setattr__(self, "_read", read)
+
+    def __getattr__(self, name: str) -> Any:
+        instance = self._instance
+        if name in type(instance).model_fields:
+            self._read.add(name)
+            return getattr(instance, name)
+        attribute = getattr(type(instance), name, None)
+        # methods and properties of the model should read the fields through the recorder as well:
+        if isinstance(attribute, types.FunctionType):
+            return types.MethodType(attribute, self)
+        if isinstance(attribute, property):
+            return attribute.fget(self)
+        return getattr(instance, name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(self._instance, name, value)
+
+
+class IncrementalModel(BaseModel):
+    """
+    Base class for models with incremental validators.
+    """
+
+    model_config = ConfigDict(validate_assignment=True)
+
+    _incremental_validators: ClassVar[List[Tuple[str, Callable]]] = []
+    # validator name -> the fields it reads, None when we do not know yet
+    _reads: ClassVar[Dict[str, Optional[Set[str]]]] = {}
+
+    @classmethod
+    def __pydantic_init_subclass__(cls, **kwargs: Any) -> None:
+        super().__pydantic_init_subclass__(**kwargs)
+        validators = {}
+        for klass in reversed(cls.__mro__):
+            for name, attribute in vars(klass).items():
+                if hasattr(attribute, "__incremental_reads__"):
+                    validators[name] = attribute
+        cls._incremental_validators = list(validators.items())
+        cls._reads = {}
+        for name, function in cls._incremental_validators:
+            declared = function.__incremental_reads__
+            if declared is not None and not declared <= set(cls.model_fields):
+                raise TypeError(f"{cls.__name__}.{name} reads unknown fields {sorted(declared - set(cls.model_fields))}")
+            cls._reads[name] = None if declared is None else set(declared)
+
+    @model_validator(mode="after")
+    def _run_incremental_validators(self):
+        assigning = _assigning.get()
+        assigning = assigning[1] if assigning is not None and assigning[0] is self else None
+        reads = self._reads
+        for name, function in self._incremental_validators:
+            fields = reads[name]
+            if assigning is not None and fields is not None and assigning not in fields:
+                continue
+            if function.__incremental_reads__ is None:
+                read: Set[str] = set()
+                try:
+                    function(_Recorder(self, read))
+                finally:
+                    reads[name] = (fields or set()) | read
+            else:
+                function(self)
+        return self
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        """
+        Assign through Pydantic, and put the old value back when a validator rejects the new one.
+        Pydantic itself keeps the rejected value when a model validator fails.
+        """
+        token = _assigning.set((self, name))
+        old = self.__dict__.get(name, _MISSING)
+        try:
+            super().__setattr__(name, value)
+        except ValidationError:
+            if old is not _MISSING:
+                self.__dict__[name] = old
+            raise
+        finally:
+            _assigning.reset(token)
+
+
+class Interface(BaseModel):
+    """
+    An interface on a NetworkDevice
+    """
+
+    interface_name: str
+    ipv4: Union[ipaddress.IPv4Interface, None] = None
+
+
+class NetworkDevice(IncrementalModel):
+    """
+    Representation of a NetworkDevice
+    """
+
+    fqdn_name: str
+    hostname: str
+    role: str
+    username: str
+    password: str
+    site: str
+    mgmt_ip: ipaddress.IPv4Interface
+    interfaces: List[Interface] = []
+
+    calls: ClassVar[Dict[str, int]] = {"check_fqdn_name": 0, "check_ipv4_overlap": 0}
+
+    @incremental_validator("hostname", "fqdn_name")
+    def check_fqdn_name(self):
+        self.calls["check_fqdn_name"] += 1
+        if self.hostname not in self.fqdn_name:
+            raise ValueError(f"hostname {self.hostname} must be included in fqdn_name {self.fqdn_name}.")
+
+    def all_ip_addresses(self) -> List[ipaddress.IPv4Interface]:
+        return [self.mgmt_ip] + [interface.ipv4 for interface in self.interfaces if interface.ipv4]
+
+    @incremental_validator()
+    def check_ipv4_overlap(self):
+        self.calls["check_ipv4_overlap"] += 1
+        for ip1, ip2 in itertools.combinations(self.all_ip_addresses(), 2):
+            if ip1.network.overlaps(ip2.network):
+                raise ValueError(f"Overlapping IPs detected:{ip1.network} and {ip2.network}")
+
+
+device = NetworkDevice(
+    hostname="router-1",
+    fqdn_name="router-1.example.com",
+    role="dar",
+    username="said",
+    password="lovely",
+    site="dal09",
+    mgmt_ip="1.1.1.1/32",
+    interfaces=[{"interface_name": f"et-0/0/{i}", "ipv4": f"10.0.{i}.0/31"} for i in range(100)],
+)
+print(f"fields read by the validators: {NetworkDevice._reads}")
+print(f"after creating the device: {NetworkDevice.calls}")
+device.password = "even lovelier"
+print(f"after changing the password: {NetworkDevice.calls}")
+device.fqdn_name = "router-1.dal09.example.com"
+print(f"after changing the fqdn_name: {NetworkDevice.calls}")
+try:
+    device.mgmt_ip = "10.0.0.1/32"
+except ValidationError as err:
+    print(err)
+print(f"after changing the mgmt_ip: {NetworkDevice.calls}, mgmt_ip is still {device.mgmt_ip}")
+"""
+fields read by the validators: {'check_fqdn_name': {'fqdn_name', 'hostname'}, 'check_ipv4_overlap': {'interfaces', 'mgmt_ip'}}
+after creating the device: {'check_fqdn_name': 1, 'check_ipv4_overlap': 1}
+after changing the password: {'check_fqdn_name': 1, 'check_ipv4_overlap': 1}
+after changing the fqdn_name: {'check_fqdn_name': 2, 'check_ipv4_overlap': 1}
+1 validation error for NetworkDevice
+  Value error, Overlapping IPs detected:10.0.0.1/32 and 10.0.0.0/31 ...
+after changing the mgmt_ip: {'check_fqdn_name': 2, 'check_ipv4_overlap': 2}, mgmt_ip is still 1.1.1.1/32
+"""
+
+
+class Location(IncrementalModel):
+    rack: int
+
+    @incremental_validator("rack")
+    def check_rack(self):
+        if self.rack < 0:
+            raise ValueError(f"rack {self.rack} must not be negative")
+
+
+class Placement(IncrementalModel):
+    hostname: str
+    location: Location
+
+
+# a nested model that is validated during an assignment runs all its validators:
+placement = Placement(hostname="router-1", location={"rack": 1})
+try:
+    placement.location = {"rack": -1}
+except ValidationError as err:
+    print(err)
+print(f"location is still {placement.location}")
+"""
+1 validation error for Placement
+location
+  Value error, rack -1 must not be negative ...
+location is still rack=1
+"""
+
+
+class PlainNetworkDevice(BaseModel):
+    """
+    The same device, where every assignment reruns every validator.
+    """
+
+    model_config = ConfigDict(validate_assignment=True)
+
+    fqdn_name: str
+    hostname: str
+    role: str
+    username: str
+    password: str
+    site: str
+    mgmt_ip: ipaddress.IPv4Interface
+    interfaces: List[Interface] = []
+
+    @model_validator(mode="after")
+    def check_fqdn_name(self):
+        if self.hostname not in self.fqdn_name:
+            raise ValueError(f"hostname {self.hostname} must be included in fqdn_name {self.fqdn_name}.")
+        return self
+
+    @model_validator(mode="after")
+    def check_ipv4_overlap(self):
+        all_ip_addresses = [self.mgmt_ip] + [interface.ipv4 for interface in self.interfaces if interface.ipv4]
+        for ip1, ip2 in itertools.combinations(all_ip_addresses, 2):
+            if ip1.network.overlaps(ip2.network):
+                raise ValueError(f"Overlapping IPs detected:{ip1.network} and {ip2.network}")
+        return self
+
+
+plain = PlainNetworkDevice(**device.model_dump())
+number = 20
+for name, instance in [("validate_assignment", plain), ("incremental", device)]:
+    seconds = timeit.timeit(lambda: setattr(instance, "password", "lovely"), number=number) / number
+    print(f"{name:<20} {seconds * 1e6:>10.1f}us per password change")
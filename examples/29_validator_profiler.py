@@ -0,0 +1,329 @@
+"""
+Finding out which validator makes creating a model slow.
+
+When creating a NetworkDevice is slow, the time could go into the parsing that pydantic-core
+does, into a field validator like 'vlan_validator' from example 05, into a before validator like
+'sanitize_hostname' from example 06 or into an after validator like 'check_ipv4_overlap' from
+example 07. The profiler of Python mostly shows the inside of pydantic-core.
+
+In this example, the 'ValidatorProfiler' instruments the models you hand it:
+- every field and model validator is wrapped in a function that times it
+- the validator of the model itself is timed, so we also know how much time is left for the
+  parsing by pydantic-core
+- for every validator and model we keep the number of calls, the total time and the most
+  recent durations, to compute the p99
+- the results are printed as a report, or exported in the Prometheus text format
+
+The wrapping is done on the decorators Pydantic collected for the model, after which the model is
+rebuilt. A model that is not instrumented, or no longer instrumented, runs its own validators
+again, so the profiler costs nothing when it is not used.
+
+Nested models are part of the schema of the model that contains them. Instrument them before,
+or together with, the models that contain them, so those are rebuilt with the timed validators.
+The time of a nested model is counted in the model that was validated, not separately.
+"""
+from collections import deque
+from contextlib import contextmanager
+import dataclasses
+import functools
+import ipaddress
+import itertools
+import time
+import timeit
+from typing import Any, Callable, Deque, Dict, Iterator, List, Tuple, Type, Union
+
+from pydantic import BaseModel, field_validator, model_validator
+
+
+# the validators Pydantic collects on a model, that the profiler wraps:
+_VALIDATOR_KINDS = ("validators", "field_validators", "root_validators", "model_validators")
+
+
+class Timing:
+    """
+    The number of calls and the total time, with a window of the most recent durations.
+    """
+
+    __slots__ = ("calls", "total_ns", "samples")
+
+    def __init__(self, window: int) -> None:
+        self.calls = 0
+        self.total_ns = 0
+        self.samples: Deque[int] = deque(maxlen=window)
+
+    def add(self, elapsed_ns: int) -> None:
+        self.calls += 1
+        self.total_ns += elapsed_ns
+        self.samples.append(elapsed_ns)
+
+    def quantile(self, q: float) -> int:
+        if not self.samples:
+            return 0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class _TimedValidator:
+    """
+    Stands in for the SchemaValidator of an instrumented model, and times every validation.
+    """
+
+    def __init__(self, profiler: "ValidatorProfiler", model: Type[BaseModel], validator: Any) -> None:
+        self._profiler = profiler
+        self._validator = validator
+        self._timing = profiler.models.setdefault(model.__name__, Timing(profiler.window))
+        self._model_name = model.__name__
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._validator, name)
+
+    def _timed(self, method: Callable, *args: Any, **kwargs: Any) -> Any:
+        profiler = self._profiler
+        validators_before = profiler._validator_ns
+        start = time.perf_counter_ns()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter_ns() - start
+            self._timing.add(elapsed)
+            profiler.core_ns[self._model_name] += elapsed - (profiler._validator_ns - validators_before)
+
+    def validate_python(self, *args: Any, **kwargs: Any) -> Any:
+        return self._timed(self._validator.validate_python, *args, **kwargs)
+
+    def validate_json(self, *args: Any, **kwargs: Any) -> Any:
+        return self._timed(self._validator.validate_json, *args, **kwargs)
+
+    def validate_strings(self, *args: Any, **kwargs: Any) -> Any:
+        return self._timed(self._validator.validate_strings, *args, **kwargs)
+
+    def validate_assignment(self, *args: Any, **kwargs: Any) -> Any:
+        return self._timed(self._validator.validate_assignment, *args, **kwargs)
+
+
+class ValidatorProfiler:
+    """
+    Times the validators and the validation of the models it instruments.
+    """
+
+    def __init__(self, window: int = 10_000) -> None:
+        self.window = window
+        # (model name, validator name) -> timing
+        self.validators: Dict[Tuple[str, str], Timing] = {}
+        # model name -> timing of the whole validation
+        self.models: Dict[str, Timing] = {}
+        # model name -> the part of that time that was not spent in the validators
+        self.core_ns: Dict[str, int] = {}
+        self._validator_ns = 0
+        self._originals: Dict[Type[BaseModel], Any] = {}
+
+    def _wrap(self, model: Type[BaseModel], name: str, function: Callable) -> Callable:
+        timing = self.validators.setdefault((model.__name__, name), Timing(self.window))
+
+        # functools.wraps keeps the signature, which Pydantic inspects to decide how to call it:
+        @functools.wraps(function)
+        def timed(*args: Any, **kwargs: Any) -> Any:
+            start = time.perf_counter_ns()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter_ns() - start
+                self._validator_ns += elapsed
+                timing.add(elapsed)
+
+        return timed
+
+    def instrument(self, *models: Type[BaseModel]) -> None:
+        """
+        Time the validators of the models, nested models first.
+        """
+        for model in models:
+            if model in self._originals:
+                continue
+            original = model.__pydantic_decorators__
+            self._originals[model] = original
+            decorators = dataclasses.replace(original)
+            for kind in _VALIDATOR_KINDS:
+                setattr(
+                    decorators,
+                    kind,
+                    {
+                        name: dataclasses.replace(decorator, func=self._wrap(model, name, decorator.func))
+                        for name, decorator in getattr(original, kind).items()
+                    },
+                )
+            model.__pydantic_decorators__ = decorators
+            model.model_rebuild(force=True)
+            self.core_ns.setdefault(model.__name__, 0)
+            model.__pydantic_validator__ = _TimedValidator(self, model, model.__pydantic_validator__)
+
+    def uninstrument(self, *models: Type[BaseModel]) -> None:
+        """
+        Put the original validators back, on all the instrumented models when none are given.
+        """
+        for model in models or list(self._originals):
+            original = self._originals.pop(model, None)
+            if original is not None:
+                model.__pydantic_decorators__ = original
+                model.model_rebuild(force=True)
+
+    @contextmanager
+    def profile(self, *models: Type[BaseModel]) -> Iterator["ValidatorProfiler"]:
+        self.instrument(*models)
+        try:
+            yield self
+        finally:
+            self.uninstrument(*models)
+
+    def report(self) -> str:
+        """
+        A table with the models and the validators, the ones that take the most time first.
+        """
+        rows: List[Tuple[str, Timing]] = [(f"{model} (validation)", timing) for model, timing in self.models.items()]
+        rows += [(f"{model}.{name}", timing) for (model, name), timing in self.validators.items()]
+        rows = sorted((row for row in rows if row[1].calls), key=lambda row: row[1].total_ns, reverse=True)
+        lines = [f"{'':<40} {'calls':>8} {'total ms':>10} {'mean us':>10} {'p99 us':>10}"]
+        for name, timing in rows:
+            mean = timing.total_ns / timing.calls if timing.calls else 0
+            lines.append(
+                f"{name:<40} {timing.calls:>8} {timing.total_ns / 1e6:>10.2f} "
+                f"{mean / 1e3:>10.2f} {timing.quantile(0.99) / 1e3:>10.2f}"
+            )
+        for model, core_ns in self.core_ns.items():
+            total_ns = self.models[model].total_ns
+            if not total_ns:
+                continue
+            lines.append(f"{model}: {core_ns / total_ns:.0%} of the validation time is spent outside the validators")
+        return "\n".join(lines)
+
+    def prometheus(self) -> str:
+        """
+        The timings in the Prometheus text format, as summaries with a 0.5 and 0.99 quantile.
+        """
+        lines = []
+        metrics = [
+            (
+                "pydantic_validator_seconds",
+                "Time spent in a validator.",
+                [({"model": model, "validator": name}, timing) for (model, name), timing in self.validators.items()],
+            ),
+            (
+                "pydantic_model_validation_seconds",
+                "Time spent validating a model, including its validators.",
+                [({"model": model}, timing) for model, timing in self.models.items()],
+            ),
+        ]
+        for metric, help_text, series in metrics:
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} summary")
+            for labels, timing in series:
+                if not timing.calls:
+                    continue
+                label_text = ",".join(f'{key}="{value}"' for key, value in labels.items())
+                for q in (0.5, 0.99):
+                    lines.append(f'{metric}{{{label_text},quantile="{q}"}} {timing.quantile(q) / 1e9:.9f}')
+                lines.append(f"{metric}_sum{{{label_text}}} {timing.total_ns / 1e9:.9f}")
+                lines.append(f"{metric}_count{{{label_text}}} {timing.calls}")
+        return "\n".join(lines) + "\n"
+
+
+class Interface(BaseModel):
+    """
+    An interface on a NetworkDevice
+    """
+
+    interface_name: str
+    vlan: int
+    ipv4: Union[ipaddress.IPv4Interface, None] = None
+
+    @field_validator("vlan")
+    @classmethod
+    def vlan_validator(cls, v):
+        assert v >= 1, "invalid vlan number, number too low"
+        assert v <= 4094, "invalid vlan number, number too high"
+        return v
+
+
+class NetworkDevice(BaseModel):
+    """
+    Representation of a NetworkDevice
+    """
+
+    fqdn_name: str
+    hostname: str
+    role: str
+    username: str
+    password: str
+    site: str
+    mgmt_ip: ipaddress.IPv4Interface
+    interfaces: List[Interface] = []
+
+    @model_validator(mode="before")
+    @classmethod
+    def sanitize_hostname(cls, data: Any) -> Any:
+        data["hostname"] = data["hostname"].strip().lower()
+        return data
+
+    @model_validator(mode="after")
+    def check_ipv4_overlap(self):
+        all_ip_addresses = [self.mgmt_ip] + [i.ipv4 for i in self.interfaces if i.ipv4]
+        for ip1, ip2 in itertools.combinations(all_ip_addresses, 2):
+            if ip1.network.overlaps(ip2.network):
+                raise ValueError(f"Overlapping IPs detected:{ip1.network} and {ip2.network}")
+        return self
+
+
+def make_router(number: int) -> dict:
+    hostname = f"Router-{number} "
+    return {
+        "hostname": hostname,
+        "fqdn_name": f"router-{number}.example.com",
+        "role": "dar",
+        "username": "said",
+        "password": "lovely",
+        "site": "dal09",
+        "mgmt_ip": f"1.1.{number // 256 % 256}.{number % 256}/32",
+        "interfaces": [
+            {"interface_name": f"et-0/0/{i}", "vlan": 100 + i, "ipv4": f"10.0.{i}.0/31"} for i in range(24)
+        ],
+    }
+
+
+routers = [make_router(number) for number in range(2000)]
+
+profiler = ValidatorProfiler()
+with profiler.profile(Interface, NetworkDevice):
+    for router in routers:
+        NetworkDevice(**router)
+print(profiler.report())
+print(profiler.prometheus())
+"""
+                                            calls   total ms    mean us     p99 us
+NetworkDevice (validation)                   2000     ...
+NetworkDevice.check_ipv4_overlap             2000     ...
+Interface.vlan_validator                    48000     ...
+NetworkDevice.sanitize_hostname              2000     ...
+NetworkDevice: ...% of the validation time is spent outside the validators
+# HELP pydantic_validator_seconds Time spent in a validator.
+# TYPE pydantic_validator_seconds summary
+pydantic_validator_seconds{model="Interface",validator="vlan_validator",quantile="0.5"} 0.000000...
+...
+"""
+
+
+# the cost of the instrumentation, and what is left of it afterwards:
+number = 3
+
+
+def create_all() -> None:
+    for router in routers:
+        NetworkDevice(**router)
+
+
+before = timeit.timeit(create_all, number=number) / number
+profiler.instrument(Interface, NetworkDevice)
+instrumented = timeit.timeit(create_all, number=number) / number
+profiler.uninstrument()
+assert not isinstance(NetworkDevice.__pydantic_validator__, _TimedValidator)
+after = timeit.timeit(create_all, number=number) / number
+print(f"never instrumented: {before:.3f}s, instrumented: {instrumented:.3f}s, uninstrumented: {after:.3f}s")
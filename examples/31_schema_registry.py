@@ -0,0 +1,238 @@
+"""
+Cutting the startup time of a process with hundreds of models.
+
+Every time a process starts, Pydantic builds the validation schema of every model as soon as the
+class is defined, whether the process uses the model or not. And the schema endpoint of our API
+calls 'model_json_schema()', the v2 form of 'jan.schema()' from example 00, on every request.
+
+In this example, I combine two things:
+- 'defer_build=True' in the model_config, so Pydantic only builds the validation schema of a
+  model when it is used for the first time
+- a 'SchemaRegistry' that computes the JSON schema of a model once, and keeps it in memory and
+  on disk for the next process
+
+A JSON schema on disk is only used when the source of the model is unchanged. Getting the source
+of a single class means parsing its whole module, which for a module with hundreds of models
+costs more than it saves. So the registry hashes the source files of the module of the model and
+of its bases, its nested models and their validators. Changing any model in a module invalidates
+the schemas of all the models in it, which is a small price.
+
+As 'model_json_schema()' needs the validation schema, a schema that comes from disk does not
+trigger building a deferred model either.
+"""
+import hashlib
+import ipaddress
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from typing import Any, Dict, List, Optional, Tuple, Type, Union
+
+import pydantic
+from pydantic import BaseModel, ConfigDict
+
+from _model_sources import source_files
+
+
+class SchemaRegistry:
+    """
+    JSON schemas of models, cached in memory and in cache_dir.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None) -> None:
+        self.cache_dir = cache_dir
+        # (model, mode) -> the schema serialized as JSON
+        self._schemas: Dict[Tuple[Type[BaseModel], str], bytes] = {}
+        self._file_hashes: Dict[str, str] = {}
+
+    def _hash_file(self, path: str) -> str:
+        digest = self._file_hashes.get(path)
+        if digest is None:
+            with open(path, "rb") as f:
+                digest = hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+            self._file_hashes[path] = digest
+        return digest
+
+    def source_hash(self, model: Type[BaseModel]) -> Optional[str]:
+        """
+        A hash of the source files of the model, its bases, its nested models and their validators,
+        the same files example 26 uses, together with the version of Pydantic. None when one of them
+        does not come from a file.
+        """
+        files = source_files(model)
+        if files is None:
+            return None
+        hashes = "".join(self._hash_file(path) for path in sorted(files))
+        return hashlib.blake2b(f"{pydantic.VERSION}:{hashes}".encode(), digest_size=16).hexdigest()
+
+    def _path(self, model: Type[BaseModel], mode: str) -> Optional[str]:
+        if self.cache_dir is None:
+            return None
+        return os.path.join(self.cache_dir, f"{model.__module__}.{model.__qualname__}.{mode}.json")
+
+    def json_schema_bytes(self, model: Type[BaseModel], mode: str = "validation") -> bytes:
+        """
+        The JSON schema of the model, already serialized, which is what a schema endpoint returns.
+        """
+        key = (model, mode)
+        schema = self._schemas.get(key)
+        if schema is not None:
+            return schema
+        path = self._path(model, mode)
+        source_hash = self.source_hash(model) if path else None
+        if source_hash is not None:
+            try:
+                with open(path, "rb") as f:
+                    stored_hash, _, schema = f.read().partition(b"\n")
+                if stored_hash.decode() != source_hash:
+                    schema = None
+            except OSError:
+                schema = None
+        if schema is None:
+            schema = json.dumps(model.model_json_schema(mode=mode)).encode()
+            if source_hash is not None:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                temporary = f"{path}.{os.getpid()}.tmp"
+                with open(temporary, "wb") as f:
+                    f.write(source_hash.encode() + b"\n" + schema)
+                os.replace(temporary, path)
+        self._schemas[key] = schema
+        return schema
+
+    def json_schema(self, model: Type[BaseModel], mode: str = "validation") -> Dict[str, Any]:
+        return json.loads(self.json_schema_bytes(model, mode))
+
+    def precompute(self, *models: Type[BaseModel]) -> None:
+        """
+        Fill the cache, for example right after deploying a new version.
+        """
+        for model in models:
+            self.json_schema_bytes(model)
+
+
+class Interface(BaseModel):
+    """
+    An interface on a NetworkDevice
+    """
+
+    model_config = ConfigDict(defer_build=True)
+
+    interface_name: str
+    ipv4: Union[ipaddress.IPv4Interface, None] = None
+
+
+class NetworkDevice(BaseModel):
+    """
+    Representation of a NetworkDevice
+    """
+
+    model_config = ConfigDict(defer_build=True)
+
+    fqdn_name: str
+    hostname: str
+    mgmt_ip: ipaddress.IPv4Interface
+    interfaces: List[Interface] = []
+
+
+# a module with a lot of models, with or without defer_build:
+_MODEL_TEMPLATE = '''
+class Interface{number}(BaseModel):
+    model_config = ConfigDict(defer_build={defer})
+    interface_name: str
+    ipv4: Union[ipaddress.IPv4Interface, None] = None
+    ipv6: Union[ipaddress.IPv6Interface, None] = None
+
+
+class NetworkDevice{number}(BaseModel):
+    model_config = ConfigDict(defer_build={defer})
+    fqdn_name: str
+    hostname: str
+    role: Literal["dar", "core", "edge"]
+    username: str
+    password: str
+    site: str
+    mgmt_ip: ipaddress.IPv4Interface
+    interfaces: List[Interface{number}] = []
+
+    @field_validator("hostname")
+    @classmethod
+    def lower_hostname(cls, v):
+        return v.lower()
+'''
+
+# the part that runs in a fresh process, to measure a cold start:
+_STARTUP = '''
+import importlib, importlib.util, json, sys, time
+import pydantic
+start = time.perf_counter()
+models = importlib.import_module(sys.argv[2])
+imported = time.perf_counter()
+spec = importlib.util.spec_from_file_location("schema_registry", sys.argv[1])
+schema_registry = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(schema_registry)
+registry = schema_registry.SchemaRegistry(sys.argv[3])
+before = time.perf_counter()
+registry.precompute(*models.MODELS)
+schemas = time.perf_counter()
+models.MODELS[0].model_validate({"fqdn_name": "r1.example.com", "hostname": "R1", "role": "dar", "username": "said",
+                                 "password": "lovely", "site": "dal09", "mgmt_ip": "1.1.1.1/32"})
+validated = time.perf_counter()
+print(json.dumps([imported - start, schemas - before, validated - schemas]))
+'''
+
+
+def write_models(directory: str, name: str, count: int, defer: bool) -> None:
+    with open(os.path.join(directory, f"{name}.py"), "w") as f:
+        f.write("import ipaddress\nfrom typing import List, Literal, Union\n")
+        f.write("from pydantic import BaseModel, ConfigDict, field_validator\n")
+        for number in range(count):
+            f.write(_MODEL_TEMPLATE.format(number=number, defer=defer))
+        f.write(f"\nMODELS = [{', '.join(f'NetworkDevice{number}' for number in range(count))}]\n")
+
+
+def cold_start(directory: str, name: str, cache_dir: str) -> List[float]:
+    # the models and, for _model_sources, the directory of this example:
+    python_path = os.pathsep.join([directory, os.path.dirname(os.path.abspath(__file__))])
+    environment = dict(os.environ, PYTHONPATH=python_path, PYTHONDONTWRITEBYTECODE="1")
+    output = subprocess.run(
+        [sys.executable, "-c", _STARTUP, os.path.abspath(__file__), name, cache_dir],
+        env=environment,
+        capture_output=True,
+        check=True,
+        text=True,
+    ).stdout
+    return json.loads(output)
+
+
+if __name__ == "__main__":
+    registry = SchemaRegistry()
+    print(f"built before use: {NetworkDevice.__pydantic_complete__}")
+    print(json.dumps(registry.json_schema(NetworkDevice)["properties"]["mgmt_ip"]))
+    print(f"source hash: {registry.source_hash(NetworkDevice)}")
+    """
+    built before use: False
+    {"format": "ipv4interface", "title": "Mgmt Ip", "type": "string"}
+    source hash: ...
+    """
+
+    count = 200
+    with tempfile.TemporaryDirectory() as directory:
+        write_models(directory, "eager_models", count, defer=False)
+        write_models(directory, "lazy_models", count, defer=True)
+        print(f"{count * 2} models: {'import':>10} {'schemas':>10} {'first use':>10}")
+        for name in ("eager_models", "lazy_models"):
+            cache_dir = os.path.join(directory, f"{name}_cache")
+            for cache in ("cold cache", "warm cache"):
+                timings = cold_start(directory, name, cache_dir)
+                print(f"{name:<12} {cache:<10} " + " ".join(f"{seconds:>9.3f}s" for seconds in timings))
+    """
+    400 models:     import    schemas  first use
+    eager_models cold cache     0.303s     0.246s     0.000s
+    eager_models warm cache     0.308s     0.005s     0.000s
+    lazy_models  cold cache     0.163s     0.356s     0.000s
+    lazy_models  warm cache     0.157s     0.005s     0.013s
+
+    With defer_build the import is cheap, and the time moves to the first use of a model.
+    With a warm cache the schemas come from disk, and the deferred models are never built.
+    """
@@ -0,0 +1,217 @@
+"""
+Parsing a value that we have seen before only once: interning UUIDs and IP addresses.
+
+Example 09 coerces strings into a UUID, an ipaddress.IPv4Interface and a Brand. In our feeds the
+same few thousand management IPs and interface addresses come back millions of times, and every
+occurrence is parsed into a new object again. For an IPv4Interface, that parsing is done in
+Python by the ipaddress module.
+
+In this example, an interning cache maps the input string to the instance that was parsed
+before, so all the models share the same immutable object:
+- 'Annotated[ipaddress.IPv4Interface, Interned()]' enables it for a single field
+- 'intern_types' in the model_config of an 'InterningModel' enables it for every field of
+  those types, including the ones inside Optional, Union and List
+- the cache is bounded, evicting the least recently used value, and counts hits and misses
+
+Only strings are looked up, other input and invalid strings go through the normal validation,
+so the error messages are unchanged. In strict mode nothing is interned, because a string that
+was accepted in lax mode would otherwise be accepted in strict mode as well.
+
+This only works for immutable types. An Enum is immutable, but Pydantic already returns the same
+member every time and does so faster than the cache lookup, so don't intern a Brand.
+"""
+from collections import OrderedDict
+from enum import Enum
+import ipaddress
+import random
+import time
+import tracemalloc
+import types
+from typing import Annotated, Any, Callable, ClassVar, Dict, FrozenSet, List, NamedTuple, Optional, Set, Tuple, Union
+from typing import get_args, get_origin
+from uuid import UUID, uuid4
+
+from pydantic import BaseModel, ConfigDict, GetCoreSchemaHandler
+from pydantic_core import core_schema
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    maxsize: int
+    currsize: int
+
+
+class InternCache:
+    """
+    A bounded mapping of (type, input string) to the parsed instance.
+    """
+
+    def __init__(self, maxsize: int = 65536) -> None:
+        self.maxsize = maxsize
+        self._instances: "OrderedDict[Tuple[type, str], Any]" = OrderedDict()
+        self._hits = self._misses = self._evictions = 0
+
+    def get_or_parse(self, annotation: type, value: str, parse: Callable[[str], Any]) -> Any:
+        key = (annotation, value)
+        instances = self._instances
+        instance = instances.get(key)
+        if instance is not None:
+            self._hits += 1
+            instances.move_to_end(key)
+            return instance
+        self._misses += 1
+        instance = parse(value)
+        instances[key] = instance
+        if len(instances) > self.maxsize:
+            instances.popitem(last=False)
+            self._evictions += 1
+        return instance
+
+    def cache_info(self) -> CacheInfo:
+        return CacheInfo(self._hits, self._misses, self._evictions, self.maxsize, len(self._instances))
+
+    def cache_clear(self) -> None:
+        self._instances.clear()
+        self._hits = self._misses = self._evictions = 0
+
+
+default_cache = InternCache()
+
+
+class Interned:
+    """
+    Annotated metadata that looks up the input string in an InternCache before parsing it.
+    """
+
+    def __init__(self, cache: Optional[InternCache] = None) -> None:
+        self.cache = cache or default_cache
+
+    def __get_pydantic_core_schema__(self, source: Any, handler: GetCoreSchemaHandler) -> core_schema.CoreSchema:
+        cache = self.cache
+
+        def validate(value: Any, validator: core_schema.ValidatorFunctionWrapHandler) -> Any:
+            if type(value) is not str:
+                return validator(value)
+            return cache.get_or_parse(source, value, validator)
+
+        schema = handler(source)
+        # the strict branch is picked by strict=True and by strict in the config:
+        return core_schema.lax_or_strict_schema(
+            lax_schema=core_schema.no_info_wrap_validator_function(validate, schema), strict_schema=schema
+        )
+
+    def __repr__(self) -> str:
+        return "Interned()"
+
+
+# the typing versions of the builtin containers, to rebuild an annotation with interned arguments:
+_CONTAINERS = {list: List, set: Set, frozenset: FrozenSet, tuple: Tuple, dict: Dict}
+
+
+def _intern_annotation(annotation: Any, intern_types: Tuple[type, ...], marker: Interned) -> Any:
+    if annotation in intern_types:
+        return Annotated[annotation, marker]
+    origin = get_origin(annotation)
+    if origin is None:
+        return annotation
+    args = get_args(annotation)
+    if origin is Annotated:
+        return Annotated[(_intern_annotation(args[0], intern_types, marker), *annotation.__metadata__)]
+    interned = tuple(_intern_annotation(arg, intern_types, marker) for arg in args)
+    if interned == args:
+        return annotation
+    if origin in (Union, types.UnionType):
+        return Union[interned]
+    if origin in _CONTAINERS:
+        return _CONTAINERS[origin][interned]
+    return annotation
+
+
+class InterningModel(BaseModel):
+    """
+    Base class for models that intern the types in 'intern_types' of their model_config, in the
+    'intern_cache' of the model_config or the default cache.
+
+    The annotations are rewritten before Pydantic sees them, so they can not be strings, as with
+    'from __future__ import annotations'.
+    """
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        config = cls.__dict__.get("model_config") or getattr(cls, "model_config", {})
+        intern_types = tuple(config.get("intern_types", ()))
+        annotations = cls.__dict__.get("__annotations__", {})
+        if intern_types:
+            marker = Interned(config.get("intern_cache"))
+            for name, annotation in annotations.items():
+                if not name.startswith("_") and get_origin(annotation) is not ClassVar:
+                    annotations[name] = _intern_annotation(annotation, intern_types, marker)
+        super().__init_subclass__(**kwargs)
+
+
+class Brand(Enum):
+    BMW = "bmw"
+    VOLKSWAGEN = "volkswagen"
+
+
+class SomeModel(BaseModel):
+    uuid: UUID
+    address: ipaddress.IPv4Interface
+    brand: Brand
+
+
+class SomeInternedField(BaseModel):
+    uuid: UUID
+    address: Annotated[ipaddress.IPv4Interface, Interned()]
+    brand: Brand
+
+
+class SomeInternedModel(InterningModel):
+    model_config = ConfigDict(intern_types=(UUID, ipaddress.IPv4Interface))
+
+    uuid: UUID
+    address: ipaddress.IPv4Interface
+    brand: Brand
+    addresses: List[ipaddress.IPv4Interface] = []
+
+
+data = {"uuid": "177ef0d8-6630-11ea-b69a-0242ac130003", "address": "1.1.1.1/32", "brand": "volkswagen"}
+one, two = SomeInternedModel(**data), SomeInternedModel(**data, addresses=["1.1.1.1/32"])
+print(f"the same address: {one.address is two.address is two.addresses[0]}, the same uuid: {one.uuid is two.uuid}")
+print(two.model_dump_json())
+print(default_cache.cache_info())
+"""
+the same address: True, the same uuid: True
+{"uuid":"177ef0d8-6630-11ea-b69a-0242ac130003","address":"1.1.1.1/32","brand":"volkswagen","addresses":["1.1.1.1/32"]}
+CacheInfo(hits=3, misses=2, evictions=0, maxsize=65536, currsize=2)
+"""
+
+
+# a feed of 100k records with 5000 different values:
+rng = random.Random(42)
+uuids = [str(uuid4()) for _ in range(5000)]
+addresses = [f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}/31" for i in range(0, 10000, 2)]
+records = [
+    {"uuid": rng.choice(uuids), "address": rng.choice(addresses), "brand": rng.choice(["bmw", "volkswagen"])}
+    for _ in range(100_000)
+]
+
+for model in (SomeModel, SomeInternedField, SomeInternedModel):
+    default_cache.cache_clear()
+    start = time.perf_counter()
+    models = [model.model_validate(record) for record in records]
+    seconds = time.perf_counter() - start
+    del models
+    default_cache.cache_clear()
+    tracemalloc.start()
+    models = [model.model_validate(record) for record in records]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del models
+    print(f"{model.__name__:<18} {len(records) / seconds:>10,.0f} records/s {current / 1024 / 1024:>7.1f} MiB")
+"""
+SomeModel              ... records/s    92.7 MiB
+SomeInternedField      ... records/s    58.4 MiB
+SomeInternedModel      ... records/s    55.3 MiB
+"""
@@ -0,0 +1,220 @@
+"""
+Validating a feed that mixes dozens of device kinds, without trying them one by one.
+
+Example 11 has a Router and a Switch as subclasses of NetworkDevice. When a feed mixes dozens of
+kinds, a 'Union[Router, Switch, ...]' tries every member until one fits. That is slow, and when
+a record fits none of them, the error has a section for every member.
+
+Pydantic has discriminated unions: when every member has a Literal field with its own value, the
+value in the record picks the member straight away, with a lookup in pydantic-core.
+
+In this example, a 'TaggedModel' base class sets this up:
+- the base class names the field that holds the tag, like 'kind' or the 'os' Enum
+- a subclass passes its tag as a class argument, 'class Router(NetworkDevice, tag="router")',
+  and the Literal field is added to it, so you don't repeat yourself
+- every subclass with a tag is registered on its base, so
+  'NetworkDevice.validate_tagged(record)' returns a Router or a Switch, including subclasses
+  defined later on
+
+Pydantic only matches the tag in the record with the Literal itself, and a Literal of an Enum
+member does not accept its value. An Enum tag is looked up by its value, with a small function as
+the discriminator, which is still a single lookup but in Python.
+"""
+from enum import Enum
+import ipaddress
+import time
+from typing import Annotated, Any, Callable, ClassVar, Dict, List, Literal, Optional, Type, Union
+
+from pydantic import AfterValidator, BaseModel, Discriminator, Field, Tag, TypeAdapter, ValidationError, create_model
+
+
+def _tag_key(tag: Any) -> str:
+    return str(tag.value if isinstance(tag, Enum) else tag)
+
+
+def _tag_annotation(tag: Any) -> Any:
+    """
+    A Literal of the tag. A Literal of an Enum member does not accept the value of the member, so
+    an Enum tag becomes the Enum, restricted to the member.
+    """
+    if not isinstance(tag, Enum):
+        return Literal[tag]
+
+    def only_tag(value: Enum) -> Enum:
+        if value is not tag:
+            raise ValueError(f"Input should be {tag.value!r}")
+        return value
+
+    return Annotated[type(tag), AfterValidator(only_tag)]
+
+
+def _tag_finder(tag_field: str) -> Callable[[Any], Optional[str]]:
+    def find_tag(data: Any) -> Optional[str]:
+        """
+        The tag of a record or a model, as the key of its member in the union.
+        """
+        tag = data.get(tag_field) if isinstance(data, dict) else getattr(data, tag_field, None)
+        return None if tag is None else _tag_key(tag)
+
+    return find_tag
+
+
+class TaggedModel(BaseModel):
+    """
+    Base class for a family of models, told apart by the value of their tag field.
+    """
+
+    _tag_field: ClassVar[Optional[str]] = None
+    _registry: ClassVar[Dict[Any, Type["TaggedModel"]]]
+    _adapter: ClassVar[Optional[TypeAdapter]] = None
+
+    def __init_subclass__(cls, tag_field: Optional[str] = None, tag: Any = None, **kwargs: Any) -> None:
+        if tag_field is not None:
+            # the root of a family, like NetworkDevice:
+            cls._tag_field = tag_field
+            cls._registry = {}
+        elif tag is not None:
+            if cls._tag_field is None:
+                raise TypeError(f"{cls.__name__} has a tag, but none of its bases has a tag_field")
+            if tag in cls._registry:
+                raise TypeError(f"{cls.__name__} has tag {tag!r}, which is taken by {cls._registry[tag].__name__}")
+            # the tag field is added before Pydantic collects the fields:
+            cls.__annotations__ = {**cls.__dict__.get("__annotations__", {}), cls._tag_field: _tag_annotation(tag)}
+            setattr(cls, cls._tag_field, tag)
+        super().__init_subclass__(**kwargs)
+
+    @classmethod
+    def __pydantic_init_subclass__(cls, tag: Any = None, **kwargs: Any) -> None:
+        super().__pydantic_init_subclass__(**kwargs)
+        if tag is not None:
+            cls._registry[tag] = cls
+            # forget the adapters of the bases, they do not know about this subclass yet:
+            for base in cls.__mro__:
+                if isinstance(base, type) and issubclass(base, TaggedModel):
+                    base._adapter = None
+
+    @classmethod
+    def adapter(cls) -> TypeAdapter:
+        """
+        A TypeAdapter for the discriminated union of the registered subclasses of this class.
+        """
+        adapter = cls.__dict__.get("_adapter")
+        if adapter is None:
+            members = tuple(model for model in cls._registry.values() if issubclass(model, cls))
+            if not members:
+                raise TypeError(f"{cls.__name__} has no subclasses with a tag")
+            tags = [model.model_fields[cls._tag_field].default for model in members]
+            if any(isinstance(tag, Enum) for tag in tags):
+                adapter = TypeAdapter(
+                    Annotated[
+                        Union[tuple(Annotated[model, Tag(_tag_key(tag))] for model, tag in zip(members, tags))],
+                        Discriminator(_tag_finder(cls._tag_field)),
+                    ]
+                )
+            else:
+                adapter = TypeAdapter(Annotated[Union[members], Field(discriminator=cls._tag_field)])
+            cls._adapter = adapter
+        return adapter
+
+    @classmethod
+    def validate_tagged(cls, data: Any) -> "TaggedModel":
+        """
+        Validate the data into the subclass its tag belongs to. Not named 'validate', which is the
+        deprecated v1 form of 'model_validate' on every BaseModel.
+        """
+        return cls.adapter().validate_python(data)
+
+    @classmethod
+    def validate_tagged_json(cls, data: Union[str, bytes]) -> "TaggedModel":
+        return cls.adapter().validate_json(data)
+
+
+class Os(Enum):
+    EOS = "eos"
+    JUNOS = "junos"
+    IOSXE = "iosxe"
+
+
+class NetworkDevice(TaggedModel, tag_field="kind"):
+    hostname: str
+    os: Os
+
+    def register_with_monitoring_system(self):
+        print(f"registering {self.kind} {self.hostname} with monitoring system")
+
+
+class Router(NetworkDevice, tag="router"):
+    loopback: ipaddress.IPv4Interface
+
+
+class Switch(NetworkDevice, tag="switch"):
+    vlan_interface: ipaddress.IPv4Interface
+    mgmt_vlan: int
+
+
+# the tag can be an Enum as well, when every kind runs its own os:
+class Firewall(TaggedModel, tag_field="os"):
+    hostname: str
+
+
+class JunosFirewall(Firewall, tag=Os.JUNOS):
+    zones: List[str]
+
+
+class EosFirewall(Firewall, tag=Os.EOS):
+    acl_count: int
+
+
+feed = [
+    {"kind": "router", "hostname": "router-1", "os": "junos", "loopback": "1.1.1.1/32"},
+    {"kind": "switch", "hostname": "switch-1", "os": "eos", "vlan_interface": "1.1.1.1/32", "mgmt_vlan": 1},
+]
+for device in map(NetworkDevice.validate_tagged, feed):
+    device.register_with_monitoring_system()
+print(repr(Firewall.validate_tagged({"os": "junos", "hostname": "fw-1", "zones": ["trust", "untrust"]})))
+try:
+    NetworkDevice.validate_tagged({"kind": "toaster", "hostname": "toaster-1", "os": "eos"})
+except ValidationError as err:
+    print(err)
+"""
+registering router router-1 with monitoring system
+registering switch switch-1 with monitoring system
+JunosFirewall(hostname='fw-1', zones=['trust', 'untrust'], os=<Os.JUNOS: 'junos'>)
+1 validation error for tagged-union[Router,Switch]
+  Input tag 'toaster' found using 'kind' does not match any of the expected tags: 'router', 'switch' ...
+"""
+
+
+# 50 kinds of devices, each with a field of its own:
+class Device(TaggedModel, tag_field="kind"):
+    hostname: str
+    os: Os
+
+
+kinds = [
+    create_model(
+        f"Kind{number}", __base__=Device, __cls_kwargs__={"tag": f"kind-{number}"}, **{f"port_{number}": (int, ...)}
+    )
+    for number in range(50)
+]
+untagged = TypeAdapter(Union[tuple(kinds)])
+records = [
+    {"kind": f"kind-{number % 50}", "hostname": f"device-{number}", "os": "eos", f"port_{number % 50}": number}
+    for number in range(20_000)
+]
+assert [type(Device.validate_tagged(record)) for record in records[:50]] == kinds
+
+for name, adapter in [("untagged union", untagged), ("tagged union", Device.adapter())]:
+    start = time.perf_counter()
+    for record in records:
+        adapter.validate_python(record)
+    seconds = time.perf_counter() - start
+    try:
+        adapter.validate_python({"kind": "kind-49", "hostname": "device-0", "os": "eos"})
+    except ValidationError as err:
+        count = err.error_count()
+    print(f"{name:<15} {len(records) / seconds:>10,.0f} records/s, {count:>3} errors for a record without its port")
+"""
+untagged union      42,823 records/s,  99 errors for a record without its port
+tagged union     1,018,461 records/s,   1 errors for a record without its port
+"""
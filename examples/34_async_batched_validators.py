@@ -0,0 +1,343 @@
+"""
+Validators that look something up in a database, without a query per record.
+
+The docstring of example 05 says a validator can do a lookup in a database. With a normal
+validator, validating 10k devices means 10k queries, one after the other: the N+1 problem.
+
+Pydantic validators can not be async. In this example, I add a second stage to validation:
+- '@async_field_validator("site")' and '@async_model_validator' mark async methods, that run
+  after the normal validation of the model succeeded
+- they look things up through a 'BatchLoader', instead of querying the database themselves
+- 'validate_many' validates all records, and runs the async validators of all the models at
+  the same time
+
+Every 'loader.load(key)' returns a future. The loader waits until every validator that runs has
+asked for its keys, and then fetches all of them with a single bulk query, in chunks of
+max_batch_size. A key that was loaded before is not fetched again.
+
+The errors of the async validators are turned into a ValidationError, just like the errors of the
+normal validators, so the callers can't tell the difference.
+
+The database is a local SQLite stand-in, with a delay on every query to simulate the round-trip
+to a database server.
+"""
+import asyncio
+import ipaddress
+import sqlite3
+import time
+from typing import Any, Awaitable, Callable, ClassVar, Dict, Generic, Hashable, List, NamedTuple, Optional, Sequence
+from typing import Set, Tuple, Type, TypeVar
+
+from pydantic import BaseModel, ValidationError, field_validator
+from pydantic_core import InitErrorDetails, PydanticCustomError
+
+
+Key = TypeVar("Key", bound=Hashable)
+Value = TypeVar("Value")
+ModelType = TypeVar("ModelType", bound="AsyncValidatedModel")
+
+
+class BatchLoader(Generic[Key, Value]):
+    """
+    Collects the keys that are loaded during one step of the event loop, and fetches them in bulk.
+
+    The batch function gets a list of keys and returns a dict with the values it found.
+    The keys it did not find load as None.
+    """
+
+    def __init__(
+        self, batch_function: Callable[[List[Key]], Awaitable[Dict[Key, Value]]], max_batch_size: int = 500
+    ) -> None:
+        self.batch_function = batch_function
+        self.max_batch_size = max_batch_size
+        self.batches = 0
+        self._futures: Dict[Key, "asyncio.Future[Optional[Value]]"] = {}
+        self._pending: List[Key] = []
+        # asyncio only keeps a weak reference to a task, so we keep the dispatches that are running:
+        self._tasks: Set["asyncio.Task[None]"] = set()
+
+    def load(self, key: Key) -> "asyncio.Future[Optional[Value]]":
+        future = self._futures.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self._futures[key] = loop.create_future()
+            if not self._pending:
+                # runs after every task that is ready now had its turn to ask for keys:
+                loop.call_soon(self._start_dispatch, loop)
+            self._pending.append(key)
+        return future
+
+    def _start_dispatch(self, loop: asyncio.AbstractEventLoop) -> None:
+        task = loop.create_task(self._dispatch())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self) -> None:
+        keys, self._pending = self._pending, []
+        chunks = [keys[start : start + self.max_batch_size] for start in range(0, len(keys), self.max_batch_size)]
+        await asyncio.gather(*(self._fetch(chunk) for chunk in chunks))
+
+    async def _fetch(self, keys: List[Key]) -> None:
+        self.batches += 1
+        try:
+            values = await self.batch_function(keys)
+        except Exception as err:
+            for key in keys:
+                self._futures.pop(key).set_exception(err)
+            return
+        for key in keys:
+            self._futures[key].set_result(values.get(key))
+
+
+def async_field_validator(field: str) -> Callable:
+    """
+    Mark an async method as a validator of a field: 'async def check(cls, value, loaders) -> value'.
+    """
+
+    def decorator(function: Callable) -> Callable:
+        function.__async_validator__ = field
+        return function
+
+    return decorator
+
+
+def async_model_validator(function: Callable) -> Callable:
+    """
+    Mark an async method as a validator of the model: 'async def check(self, loaders) -> None'.
+    """
+    function.__async_validator__ = None
+    return function
+
+
+class Record(NamedTuple, Generic[ModelType]):
+    """
+    The outcome of validating a single record, either model or error is set.
+    """
+
+    position: int
+    model: Optional[ModelType]
+    error: Optional[Exception]
+
+
+class AsyncValidatedModel(BaseModel):
+    """
+    Base class for models with async validators.
+    """
+
+    _async_field_validators: ClassVar[List[Tuple[str, Callable]]] = []
+    _async_model_validators: ClassVar[List[Callable]] = []
+
+    @classmethod
+    def __pydantic_init_subclass__(cls, **kwargs: Any) -> None:
+        super().__pydantic_init_subclass__(**kwargs)
+        validators = {}
+        for klass in reversed(cls.__mro__):
+            for name, attribute in vars(klass).items():
+                if hasattr(attribute, "__async_validator__"):
+                    validators[name] = attribute
+        cls._async_field_validators = [
+            (function.__async_validator__, function)
+            for function in validators.values()
+            if function.__async_validator__ is not None
+        ]
+        cls._async_model_validators = [
+            function for function in validators.values() if function.__async_validator__ is None
+        ]
+
+    async def _run_async_validators(self, loaders: Dict[str, BatchLoader]) -> None:
+        cls = type(self)
+        errors: List[InitErrorDetails] = []
+        fields = [field for field, _ in cls._async_field_validators]
+        outcomes = await asyncio.gather(
+            *(function(cls, getattr(self, field), loaders) for field, function in cls._async_field_validators),
+            return_exceptions=True,
+        )
+        for field, outcome in zip(fields, outcomes):
+            if isinstance(outcome, (ValueError, AssertionError)):
+                errors.append(_error_details((field,), getattr(self, field), outcome))
+            elif isinstance(outcome, BaseException):
+                raise outcome
+            else:
+                self.__dict__[field] = outcome
+        # like Pydantic, the model validators only run when the fields are valid:
+        if not errors:
+            outcomes = await asyncio.gather(
+                *(function(self, loaders) for function in cls._async_model_validators), return_exceptions=True
+            )
+            for outcome in outcomes:
+                if isinstance(outcome, (ValueError, AssertionError)):
+                    errors.append(_error_details((), self, outcome))
+                elif isinstance(outcome, BaseException):
+                    raise outcome
+        if errors:
+            raise ValidationError.from_exception_data(cls.__name__, errors)
+
+    @classmethod
+    async def model_validate_async(cls: Type[ModelType], data: Any, loaders: Dict[str, BatchLoader]) -> ModelType:
+        instance = cls.model_validate(data)
+        await instance._run_async_validators(loaders)
+        return instance
+
+
+def _error_details(loc: Tuple[str, ...], value: Any, err: Exception) -> InitErrorDetails:
+    return {
+        "type": PydanticCustomError("async_value_error", "{message}", {"message": str(err)}),
+        "loc": loc,
+        "input": value,
+    }
+
+
+async def validate_many(
+    records: Sequence[Any], model: Type[ModelType], loaders: Dict[str, BatchLoader]
+) -> List[Record[ModelType]]:
+    """
+    Validate all the records, with the async validators of all of them running at the same time.
+    """
+
+    async def validate(position: int, data: Any) -> Record[ModelType]:
+        try:
+            return Record(position, await model.model_validate_async(data, loaders), None)
+        except ValidationError as err:
+            return Record(position, None, err)
+
+    return await asyncio.gather(*(validate(position, data) for position, data in enumerate(records)))
+
+
+class Database:
+    """
+    The SQLite stand-in for the inventory database, every query takes latency seconds extra.
+    """
+
+    def __init__(self, latency: float = 0.0005) -> None:
+        self.latency = latency
+        self.queries = 0
+        self.connection = sqlite3.connect(":memory:")
+        self.connection.executescript(
+            """
+            CREATE TABLE sites (name TEXT PRIMARY KEY, region TEXT, active INTEGER);
+            CREATE TABLE mgmt_ips (address TEXT PRIMARY KEY, hostname TEXT);
+            """
+        )
+
+    def query(self, sql: str, parameters: Sequence[Any] = ()) -> List[tuple]:
+        self.queries += 1
+        time.sleep(self.latency)
+        return self.connection.execute(sql, parameters).fetchall()
+
+    async def query_async(self, sql: str, parameters: Sequence[Any] = ()) -> List[tuple]:
+        self.queries += 1
+        await asyncio.sleep(self.latency)
+        return self.connection.execute(sql, parameters).fetchall()
+
+
+def make_loaders(database: Database) -> Dict[str, BatchLoader]:
+    async def sites(names: List[str]) -> Dict[str, Tuple[str, bool]]:
+        rows = await database.query_async(
+            f"SELECT name, region, active FROM sites WHERE name IN ({','.join('?' * len(names))})", names
+        )
+        return {name: (region, bool(active)) for name, region, active in rows}
+
+    async def mgmt_ips(addresses: List[str]) -> Dict[str, str]:
+        rows = await database.query_async(
+            f"SELECT address, hostname FROM mgmt_ips WHERE address IN ({','.join('?' * len(addresses))})", addresses
+        )
+        return dict(rows)
+
+    return {"sites": BatchLoader(sites), "mgmt_ips": BatchLoader(mgmt_ips)}
+
+
+class NetworkDevice(AsyncValidatedModel):
+    """
+    Representation of a NetworkDevice
+    """
+
+    hostname: str
+    site: str
+    mgmt_ip: ipaddress.IPv4Interface
+
+    @async_field_validator("site")
+    async def site_exists(cls, value: str, loaders: Dict[str, BatchLoader]) -> str:
+        site = await loaders["sites"].load(value)
+        if site is None:
+            raise ValueError(f"unknown site {value}")
+        if not site[1]:
+            raise ValueError(f"site {value} is decommissioned")
+        return value
+
+    @async_model_validator
+    async def mgmt_ip_is_ours(self, loaders: Dict[str, BatchLoader]) -> None:
+        owner = await loaders["mgmt_ips"].load(str(self.mgmt_ip.ip))
+        if owner is not None and owner != self.hostname:
+            raise ValueError(f"mgmt_ip {self.mgmt_ip} is assigned to {owner}")
+
+
+class SyncNetworkDevice(BaseModel):
+    """
+    The same device with normal validators, that query the database for every record.
+    """
+
+    hostname: str
+    site: str
+    mgmt_ip: ipaddress.IPv4Interface
+
+    @field_validator("site")
+    @classmethod
+    def site_exists(cls, value: str) -> str:
+        rows = database.query("SELECT region, active FROM sites WHERE name = ?", (value,))
+        if not rows:
+            raise ValueError(f"unknown site {value}")
+        if not rows[0][1]:
+            raise ValueError(f"site {value} is decommissioned")
+        return value
+
+    @field_validator("mgmt_ip")
+    @classmethod
+    def mgmt_ip_is_ours(cls, value: ipaddress.IPv4Interface, info) -> ipaddress.IPv4Interface:
+        rows = database.query("SELECT hostname FROM mgmt_ips WHERE address = ?", (str(value.ip),))
+        if rows and rows[0][0] != info.data.get("hostname"):
+            raise ValueError(f"mgmt_ip {value} is assigned to {rows[0][0]}")
+        return value
+
+
+database = Database()
+database.connection.executemany(
+    "INSERT INTO sites VALUES (?, ?, ?)", [(f"site-{number}", "emea", number != 13) for number in range(100)]
+)
+database.connection.executemany(
+    "INSERT INTO mgmt_ips VALUES (?, ?)", [(f"1.1.{number // 256}.{number % 256}", f"router-{number}") for number in range(2000)]
+)
+records = [
+    {"hostname": f"router-{number}", "site": f"site-{number % 101}", "mgmt_ip": f"1.1.{number // 256}.{number % 256}/32"}
+    for number in range(2000)
+]
+records[7]["mgmt_ip"] = "1.1.0.8/32"
+
+
+async def main() -> None:
+    loaders = make_loaders(database)
+    start, database.queries = time.perf_counter(), 0
+    results = await validate_many(records, NetworkDevice, loaders)
+    seconds = time.perf_counter() - start
+    errors = [result for result in results if result.error]
+    print(f"batched:    {seconds:.3f}s, {database.queries:>4} queries, {len(errors)} invalid")
+    for result in errors[:3]:
+        print(f"  record {result.position}: {result.error.errors()[0]['msg']}")
+
+
+asyncio.run(main())
+
+start, database.queries = time.perf_counter(), 0
+invalid = 0
+for record in records:
+    try:
+        SyncNetworkDevice.model_validate(record)
+    except ValidationError:
+        invalid += 1
+print(f"per record: {time.perf_counter() - start:.3f}s, {database.queries:>4} queries, {invalid} invalid")
+"""
+batched:    0.125s,    5 queries, 40 invalid
+  record 7: mgmt_ip 1.1.0.8/32 is assigned to router-8
+  record 13: site site-13 is decommissioned
+  record 100: unknown site site-100
+per record: 2.309s, 4000 queries, 40 invalid
+"""
@@ -0,0 +1,226 @@
+"""
+Stamping out thousands of devices from a template, sharing what they have in common.
+
+We create thousands of NetworkDevices from a handful of templates, that only differ in their
+hostname, fqdn_name and mgmt_ip. 'model_copy(update=...)' gives us two bad options:
+- a shallow copy shares the interfaces list, so appending an interface to one device appends
+  it to the template and to every other device made from it
+- a deep copy copies every interface of every device, while they are all the same
+
+Neither of them validates the values in update.
+
+In this example, 'derive(template, **update)' makes a copy-on-write copy:
+- the interfaces are a 'CowList', a list that shares its items with the lists it was copied
+  from, and only makes a copy of its own when it is changed
+- the Interface model is frozen, so an interface can be shared safely: to change one, you
+  replace it in the list
+- the copy is validated with the values in update, including the model validators
+
+The values that come from the template were validated before. Pydantic accepts the nested models
+as they are, without validating them again or making a copy. The lists that were not updated are
+replaced by a CowList that shares the items of the template.
+"""
+import copy
+import ipaddress
+import time
+import tracemalloc
+from typing import Any, Iterable, List, MutableSequence, TypeVar, Union, overload
+
+from pydantic import BaseModel, ConfigDict, GetCoreSchemaHandler, model_validator
+from pydantic_core import core_schema
+
+
+Item = TypeVar("Item")
+ModelType = TypeVar("ModelType", bound=BaseModel)
+
+
+class CowList(MutableSequence[Item]):
+    """
+    A list that shares its items with its copies, until one of them is changed.
+    """
+
+    __slots__ = ("_items", "_owned")
+
+    def __init__(self, items: Iterable[Item] = ()) -> None:
+        self._items: List[Item] = list(items)
+        self._owned = True
+
+    def share(self) -> "CowList[Item]":
+        """
+        A copy that shares the items, from now on both have to copy them before a change.
+        """
+        shared = CowList.__new__(CowList)
+        shared._items = self._items
+        shared._owned = self._owned = False
+        return shared
+
+    def _own(self) -> List[Item]:
+        if not self._owned:
+            self._items = list(self._items)
+            self._owned = True
+        return self._items
+
+    @overload
+    def __getitem__(self, index: int) -> Item: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> List[Item]: ...
+
+    def __getitem__(self, index):
+        return self._items[index]
+
+    def __setitem__(self, index, value) -> None:
+        self._own()[index] = value
+
+    def __delitem__(self, index) -> None:
+        del self._own()[index]
+
+    def insert(self, index: int, value: Item) -> None:
+        self._own().insert(index, value)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, CowList):
+            other = other._items
+        return self._items == other
+
+    def __repr__(self) -> str:
+        return f"CowList({self._items!r})"
+
+    def __copy__(self) -> "CowList[Item]":
+        return self.share()
+
+    def __deepcopy__(self, memo: dict) -> "CowList[Item]":
+        return CowList(copy.deepcopy(self._items, memo))
+
+    @classmethod
+    def __get_pydantic_core_schema__(cls, source: Any, handler: GetCoreSchemaHandler) -> core_schema.CoreSchema:
+        (item,) = getattr(source, "__args__", (Any,))
+        return core_schema.no_info_after_validator_function(
+            cls,
+            handler.generate_schema(List[item]),
+            serialization=core_schema.plain_serializer_function_ser_schema(list, info_arg=False),
+        )
+
+
+def derive(template: ModelType, **update: Any) -> ModelType:
+    """
+    A copy of the template with the values in update, that shares its CowLists and nested models.
+    """
+    data = {name: value._items if isinstance(value, CowList) else value for name, value in template.__dict__.items()}
+    data.update(update)
+    derived = template.model_validate(data)
+    values = derived.__dict__
+    for name, value in template.__dict__.items():
+        if isinstance(value, CowList) and name not in update:
+            values[name] = value.share()
+    return derived
+
+
+class Interface(BaseModel):
+    """
+    An interface on a NetworkDevice
+    """
+
+    model_config = ConfigDict(frozen=True)
+
+    interface_name: str
+    ipv4: Union[ipaddress.IPv4Interface, None] = None
+    description: str = ""
+
+
+class NetworkDevice(BaseModel):
+    """
+    Representation of a NetworkDevice
+    """
+
+    fqdn_name: str
+    hostname: str
+    role: str
+    username: str
+    password: str
+    site: str
+    mgmt_ip: ipaddress.IPv4Interface
+    interfaces: CowList[Interface] = CowList()
+
+    @model_validator(mode="after")
+    def check_fqdn_name(self):
+        if self.hostname not in self.fqdn_name:
+            raise ValueError(f"hostname {self.hostname} must be included in fqdn_name {self.fqdn_name}.")
+        return self
+
+
+template = NetworkDevice(
+    hostname="template",
+    fqdn_name="template.example.com",
+    role="dar",
+    username="said",
+    password="lovely",
+    site="dal09",
+    mgmt_ip="1.1.1.1/32",
+    interfaces=[
+        {"interface_name": f"et-0/0/{i}", "ipv4": f"10.0.{i}.0/31", "description": f"uplink to spine-{i}"}
+        for i in range(48)
+    ],
+)
+
+router_1 = derive(template, hostname="router-1", fqdn_name="router-1.example.com", mgmt_ip="1.1.1.2/32")
+router_2 = derive(template, hostname="router-2", fqdn_name="router-2.example.com", mgmt_ip="1.1.1.3/32")
+print(f"sharing the interfaces: {router_1.interfaces[0] is router_2.interfaces[0] is template.interfaces[0]}")
+router_1.interfaces.append(Interface(interface_name="lo0", ipv4="2.2.2.2/32"))
+print(f"after appending: router-1 {len(router_1.interfaces)}, router-2 {len(router_2.interfaces)}, template {len(template.interfaces)}")
+print(f"{router_1.mgmt_ip!r}, still sharing the interfaces: {router_1.interfaces[0] is template.interfaces[0]}")
+print(router_2.model_dump_json(include={"hostname", "mgmt_ip"}), router_2.interfaces[0].model_dump_json())
+try:
+    derive(template, hostname="router-3")
+except ValueError as err:
+    print(err)
+"""
+sharing the interfaces: True
+after appending: router-1 49, router-2 48, template 48
+IPv4Interface('1.1.1.2/32'), still sharing the interfaces: True
+{"hostname":"router-2","mgmt_ip":"1.1.1.3/32"} {"interface_name":"et-0/0/0","ipv4":"10.0.0.0/31","description":"uplink to spine-0"}
+1 validation error for NetworkDevice
+  Value error, hostname router-3 must be included in fqdn_name template.example.com. ...
+"""
+
+
+def make_update(number: int) -> dict:
+    return {
+        "hostname": f"router-{number}",
+        "fqdn_name": f"router-{number}.example.com",
+        "mgmt_ip": f"1.1.{number // 256 % 256}.{number % 256}/32",
+    }
+
+
+def deep_copy(number: int) -> NetworkDevice:
+    update = make_update(number)
+    update["mgmt_ip"] = ipaddress.IPv4Interface(update["mgmt_ip"])
+    return template.model_copy(update=update, deep=True)
+
+
+def copy_on_write(number: int) -> NetworkDevice:
+    return derive(template, **make_update(number))
+
+
+count = 2000
+for name, make in [("deep copy", deep_copy), ("copy-on-write", copy_on_write)]:
+    start = time.perf_counter()
+    devices = [make(number) for number in range(count)]
+    seconds = time.perf_counter() - start
+    del devices
+    tracemalloc.start()
+    devices = [make(number) for number in range(count)]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del devices
+    print(f"{name:<14} {count / seconds:>9,.0f} devices/s {current / 1024 / 1024:>7.1f} MiB for {count} devices")
+"""
+deep copy          1,159 devices/s    83.6 MiB for 2000 devices
+copy-on-write     12,000 devices/s     3.5 MiB for 2000 devices
+"""
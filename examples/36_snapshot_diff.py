@@ -0,0 +1,273 @@
+"""
+Comparing two snapshots of the inventory, without comparing every field of every device.
+
+Every polling cycle we compare the previous and the new inventory to find the devices that were
+added, removed or changed, and what changed. Comparing the 'model_dump()' of every device with
+its previous version visits every field of every device, while only 1% of them changed.
+
+In this example, every model has a fingerprint: a hash of its fields, in which a nested model
+counts with its own fingerprint. The fingerprint is computed once and cached on the instance.
+A diff then:
+- matches the devices of both snapshots on a key field, like the hostname
+- skips a device when the fingerprints are the same, which is almost always
+- for the others, compares field by field, and skips the nested models with the same fingerprint
+- returns a compact ChangeSet of the added and removed keys and the changed paths
+
+Caching a fingerprint is only safe when the model can not change, so the models are frozen,
+like in example 26. Frozen does not freeze a list inside the model, so the nested collections are
+declared as a Tuple. The cache lives in a slot, like in example 21, so Pydantic does not know
+about it.
+
+The fingerprint is Python's hash, so equal fingerprints of different values are possible, but
+very unlikely at 64 bits. The hash of a number is the number itself, modulo a prime, and
+hash(-1) == hash(-2) == hash(-1.0), so numbers are hashed by their type and repr instead.
+String hashes differ between processes, so don't store fingerprints; compare snapshots within
+the same process.
+
+Nested lists are compared by position, so inserting an interface at the start reports every
+interface after it as changed.
+"""
+import ipaddress
+import random
+import time
+from typing import Any, Dict, Hashable, Iterable, List, NamedTuple, Tuple, Union
+
+from pydantic import BaseModel, ConfigDict
+
+
+class FingerprintedModel(BaseModel):
+    """
+    Base class for frozen models with a cached fingerprint.
+    """
+
+    model_config = ConfigDict(frozen=True)
+
+    __slots__ = ("__fingerprint__",)
+
+    def fingerprint(self) -> int:
+        try:
+            return _cached_fingerprint(self)
+        except AttributeError:
+            pass
+        fingerprint = hash((type(self), *map(_fingerprint, self.__dict__.values())))
+        _store_fingerprint(self, fingerprint)
+        return fingerprint
+
+
+# reading the slot through its descriptor skips the '__getattr__' of Pydantic when it is empty:
+_cached_fingerprint = FingerprintedModel.__dict__["__fingerprint__"].__get__
+_store_fingerprint = FingerprintedModel.__dict__["__fingerprint__"].__set__
+
+
+# the types that are hashed as they are, numbers are hashed by their repr:
+_SIMPLE = frozenset({str, type(None)})
+_NUMBERS = frozenset({int, float, bool})
+
+
+def _fingerprint(value: Any) -> Hashable:
+    kind = type(value)
+    if kind in _SIMPLE:
+        return value
+    if kind in _NUMBERS:
+        return (kind, repr(value))
+    if isinstance(value, FingerprintedModel):
+        return value.fingerprint()
+    if isinstance(value, (list, tuple)):
+        return hash((kind, *map(_fingerprint, value)))
+    if isinstance(value, dict):
+        return hash(frozenset((_fingerprint(key), _fingerprint(item)) for key, item in value.items()))
+    return (kind, value)
+
+
+class Change(NamedTuple):
+    """
+    A value that changed, at a path like ('interfaces', 3, 'ipv4').
+    None as the old value means it was added, None as the new value means it was removed.
+    """
+
+    path: Tuple[Union[str, int], ...]
+    old: Any
+    new: Any
+
+
+class ChangeSet(NamedTuple):
+    added: List[Hashable]
+    removed: List[Hashable]
+    changed: Dict[Hashable, List[Change]]
+
+    @property
+    def devices(self) -> int:
+        """
+        The number of keys that were added, removed or changed.
+        """
+        return len(self.added) + len(self.removed) + len(self.changed)
+
+
+def _changes(old: Any, new: Any, path: Tuple[Union[str, int], ...]) -> Iterable[Change]:
+    if isinstance(old, FingerprintedModel) and type(old) is type(new):
+        if old.fingerprint() == new.fingerprint():
+            return
+        for name in type(old).model_fields:
+            yield from _changes(old.__dict__[name], new.__dict__[name], (*path, name))
+    elif isinstance(old, (list, tuple)) and isinstance(new, (list, tuple)):
+        for index in range(max(len(old), len(new))):
+            yield from _changes(
+                old[index] if index < len(old) else None, new[index] if index < len(new) else None, (*path, index)
+            )
+    elif old != new:
+        yield Change(path, old, new)
+
+
+class Snapshot:
+    """
+    The models of one polling cycle, by the value of their key field.
+    """
+
+    def __init__(self, models: Iterable[FingerprintedModel], key_field: str) -> None:
+        self.key_field = key_field
+        self.models: Dict[Hashable, FingerprintedModel] = {getattr(model, key_field): model for model in models}
+
+    def __len__(self) -> int:
+        return len(self.models)
+
+    def diff(self, new: "Snapshot") -> ChangeSet:
+        """
+        What changed from this snapshot to the new one.
+        """
+        old_models, new_models = self.models, new.models
+        added = [key for key in new_models if key not in old_models]
+        removed = [key for key in old_models if key not in new_models]
+        changed = {}
+        for key, old in old_models.items():
+            model = new_models.get(key)
+            if model is None or model is old or model.fingerprint() == old.fingerprint():
+                continue
+            changes = list(_changes(old, model, ()))
+            if changes:
+                changed[key] = changes
+        return ChangeSet(added, removed, changed)
+
+
+def naive_diff(old: List[BaseModel], new: List[BaseModel], key_field: str) -> ChangeSet:
+    """
+    The comparison of the model_dump() of every model, to compare with.
+    """
+
+    def changes(old: Any, new: Any, path: Tuple[Union[str, int], ...]) -> Iterable[Change]:
+        if isinstance(old, dict) and isinstance(new, dict):
+            for name in old:
+                yield from changes(old[name], new.get(name), (*path, name))
+        elif isinstance(old, (list, tuple)) and isinstance(new, (list, tuple)):
+            for index in range(max(len(old), len(new))):
+                yield from changes(
+                    old[index] if index < len(old) else None, new[index] if index < len(new) else None, (*path, index)
+                )
+        elif old != new:
+            yield Change(path, old, new)
+
+    old_dumps = {getattr(model, key_field): model.model_dump() for model in old}
+    new_dumps = {getattr(model, key_field): model.model_dump() for model in new}
+    added = [key for key in new_dumps if key not in old_dumps]
+    removed = [key for key in old_dumps if key not in new_dumps]
+    changed = {}
+    for key, dump in old_dumps.items():
+        if key in new_dumps:
+            found = list(changes(dump, new_dumps[key], ()))
+            if found:
+                changed[key] = found
+    return ChangeSet(added, removed, changed)
+
+
+class Interface(FingerprintedModel):
+    """
+    An interface on a NetworkDevice
+    """
+
+    interface_name: str
+    ipv4: Union[ipaddress.IPv4Interface, None] = None
+    description: str = ""
+
+
+class NetworkDevice(FingerprintedModel):
+    """
+    Representation of a NetworkDevice
+    """
+
+    fqdn_name: str
+    hostname: str
+    role: str
+    username: str
+    password: str
+    site: str
+    mgmt_ip: ipaddress.IPv4Interface
+    interfaces: Tuple[Interface, ...] = ()
+
+
+def make_router(number: int, password: str = "lovely", description: str = "") -> dict:
+    hostname = f"router-{number}"
+    return {
+        "hostname": hostname,
+        "fqdn_name": f"{hostname}.example.com",
+        "role": "dar",
+        "username": "said",
+        "password": password,
+        "site": "dal09",
+        "mgmt_ip": f"1.{number // 65536 % 256}.{number // 256 % 256}.{number % 256}/32",
+        "interfaces": [
+            {"interface_name": f"et-0/0/{i}", "ipv4": f"10.0.{i}.0/31", "description": description if i == 2 else ""}
+            for i in range(4)
+        ],
+    }
+
+
+count = 100_000
+rng = random.Random(42)
+churn = rng.sample(range(count), count // 100)
+new_password, new_description, removed = set(churn[0::4]), set(churn[1::4]), set(churn[2::4])
+added = range(count, count + len(churn[3::4]))
+
+start = time.perf_counter()
+old_devices = [NetworkDevice.model_validate(make_router(number)) for number in range(count)]
+new_devices = [
+    NetworkDevice.model_validate(
+        make_router(
+            number,
+            password="even lovelier" if number in new_password else "lovely",
+            description="to spine-1" if number in new_description else "",
+        )
+    )
+    for number in [*range(count), *added]
+    if number not in removed
+]
+print(f"creating two snapshots of {count} devices: {time.perf_counter() - start:.1f}s")
+
+start = time.perf_counter()
+naive = naive_diff(old_devices, new_devices, "hostname")
+print(f"model_dump diff:   {time.perf_counter() - start:.3f}s, {naive.devices} devices changed")
+
+old = Snapshot(old_devices, "hostname")
+for device in old_devices:
+    device.fingerprint()  # done during the previous cycle
+start = time.perf_counter()
+new = Snapshot(new_devices, "hostname")
+for device in new_devices:
+    device.fingerprint()
+fingerprinted = time.perf_counter()
+changes = old.diff(new)
+done = time.perf_counter()
+print(
+    f"fingerprint diff:  {done - start:.3f}s, {changes.devices} devices changed "
+    f"({fingerprinted - start:.3f}s fingerprinting the new snapshot, {done - fingerprinted:.3f}s diffing)"
+)
+assert changes == naive
+for key in list(changes.changed)[:2]:
+    print(f"{key}: {changes.changed[key]}")
+print(f"added {changes.added[:2]}..., removed {changes.removed[:2]}...")
+"""
+creating two snapshots of 100000 devices: 14.4s
+model_dump diff:   5.285s, 1000 devices changed
+fingerprint diff:  1.065s, 1000 devices changed (0.943s fingerprinting the new snapshot, 0.121s diffing)
+router-53: [Change(path=('interfaces', 2, 'description'), old='', new='to spine-1')]
+router-74: [Change(path=('password',), old='lovely', new='even lovelier')]
+added ['router-100000', 'router-100001']..., removed ['router-464', 'router-1267']...
+"""
@@ -0,0 +1,51 @@
+"""
+Finding the models a model is built from, and the source files they come from.
+
+This is not an example of its own. Example 26 and example 31 both throw away what they cached
+when the source of a model changed, and they should agree on what that source is.
+"""
+import os
+import sys
+from typing import Any, Iterator, List, Optional, Set, Type, get_args
+
+from pydantic import BaseModel
+
+
+def nested_models(model: Type[BaseModel]) -> Iterator[Type[BaseModel]]:
+    """
+    The model itself and every model in the annotations of its fields, also inside List[...],
+    Union[...] and the like, each of them once.
+    """
+    seen: Set[type] = set()
+    pending: List[Any] = [model]
+    while pending:
+        annotation = pending.pop()
+        pending.extend(get_args(annotation))
+        if not (isinstance(annotation, type) and issubclass(annotation, BaseModel)) or annotation in seen:
+            continue
+        seen.add(annotation)
+        yield annotation
+        pending.extend(field.annotation for field in annotation.model_fields.values())
+
+
+def source_files(model: Type[BaseModel]) -> Optional[Set[str]]:
+    """
+    The source files of the model, its bases, its nested models and their validators. None when
+    one of them does not come from a file.
+    """
+    modules: Set[str] = set()
+    for nested in nested_models(model):
+        modules.update(base.__module__ for base in nested.__mro__ if base is not BaseModel and issubclass(base, BaseModel))
+        decorators = nested.__pydantic_decorators__
+        for validators in (decorators.field_validators, decorators.model_validators, decorators.validators):
+            modules.update(validator.func.__module__ for validator in validators.values())
+        for field in nested.model_fields.values():
+            # like BeforeValidator(validate_no_q):
+            modules.update(item.func.__module__ for item in field.metadata if callable(getattr(item, "func", None)))
+    files = set()
+    for name in modules:
+        path = getattr(sys.modules.get(name), "__file__", None)
+        if path is None or not os.path.isfile(path):
+            return None
+        files.add(path)
+    return files